@@ -1,8 +1,9 @@
 from django.contrib import admin
 
-from authentication.models import CustomUser, Profile
+from authentication.models import CustomUser, OutboundEmail, Profile
 
 # Register your models here.
 
 admin.site.register(CustomUser)
-admin.site.register(Profile)
\ No newline at end of file
+admin.site.register(Profile)
+admin.site.register(OutboundEmail)
@@ -1,11 +1,35 @@
 from django.contrib.auth.backends import ModelBackend
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
 from .models import CustomUser
+from .tokens import TokenPrincipal
 
 class EmailBackend(ModelBackend):
     def authenticate(self, request, username=None, password=None, **kwargs):
         try:
             user = CustomUser.objects.get(email=username)  # Ensure login works with email
-            if user.check_password(password):  # Verify password
-                return user
         except CustomUser.DoesNotExist:
+            # Hash anyway so an unknown email takes as long as a wrong password.
+            CustomUser().set_password(password)
             return None
+        if user.check_password(password):  # Verify password, rehashing it if the hasher settings changed
+            return user
+
+
+class PrincipalJWTAuthentication(JWTAuthentication):
+    """
+        JWT authentication that resolves tokens carrying principal claims to a TokenPrincipal
+        instead of loading the user on every request. Tokens issued without the claims
+        fall back to the regular user lookup.
+
+        The active flag is read from the token too. Deactivating a user revokes their refresh
+        tokens, so access tokens issued before stop working within ACCESS_TOKEN_LIFETIME.
+    """
+
+    def get_user(self, validated_token):
+        if "role" not in validated_token or "is_active" not in validated_token:
+            return super().get_user(validated_token)
+        if api_settings.CHECK_USER_IS_ACTIVE and not validated_token["is_active"]:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return TokenPrincipal(validated_token)
@@ -3,7 +3,7 @@ SUPERUSER_EMAIL_VALIDATION_ERROR = "The given email must be set"
 BOTH_FILED_REQUIRED = "Please provide both email and password."
 CREDENTIAL_ERROR = "Invalid email or password."
 INVALID_EMAIL = "Invalid email"
-TOKEN_REQUIRED =  "Token is required"
+TOKEN_REQUIRED =  "uid and token are required"
 INVALID_TOKEN = "Invalid or expired token"
 PASSWORD_NOT_MATCH = "Passwords don't match"
 PASSWORD_RESET_SUCCESS = "Password reset successfully"
@@ -23,4 +23,14 @@ USER_LOGGED_OUT = "User Logged out successfully"
 ALREADY_USER_LOGGED_OUT = "Already User Logged outed"
 PROFILE_UPDATE_FAILED = "Profile Update Failed"
 PROFILE_UPDATE_SUCCESS = "Profile Update Successfully"
-PROFILE_FETCH_SUCCESSFULLY = "User Profile Fetched Successfully"
\ No newline at end of file
+PROFILE_FETCH_SUCCESSFULLY = "User Profile Fetched Successfully"
+USERS_IMPORTED = "Users imported successfully"
+USER_IMPORT_FAILED = "User Import Failed"
+INVALID_IMPORT_FILE = "Upload a .csv or .json file in the 'file' field."
+INVALID_IMPORT_JSON = "The JSON file must contain a list of users."
+EMAIL_ALREADY_EXISTS = "A user with this email already exists."
+PHONE_ALREADY_EXISTS = "A user with this phone number already exists."
+ORGANIZATION_REQUIRED = "organization is required for Nurse and Inventory Manager users."
+ORGANIZATION_NOT_FOUND = "Organization not found."
+ORGANIZATION_WITHOUT_MANAGER = "The organization has no inventory manager."
+NURSES_ONLY_IMPORT = "Inventory managers can only import nurses."
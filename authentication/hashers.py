@@ -0,0 +1,61 @@
+import base64
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    """
+        Scrypt hasher whose cost comes from the SCRYPT_* settings.
+
+        Hashes made with other parameters still verify and are upgraded on the next
+        successful login, since must_update compares them with the configured ones.
+    """
+
+    @property
+    def work_factor(self):
+        return settings.SCRYPT_WORK_FACTOR
+
+    @property
+    def block_size(self):
+        return settings.SCRYPT_BLOCK_SIZE
+
+    @property
+    def parallelism(self):
+        return settings.SCRYPT_PARALLELISM
+
+    def encode(self, password, salt, n=None, r=None, p=None):
+        # Same as Django's encode, but the memory limit follows the n and r of this hash rather
+        # than the configured ones, so hashes made with a higher cost still verify after lowering it.
+        self._check_encode_args(password, salt)
+        n = n or self.work_factor
+        r = r or self.block_size
+        p = p or self.parallelism
+        hash_ = hashlib.scrypt(password.encode(), salt=salt.encode(), n=n, r=r, p=p,
+                               maxmem=self.memory_limit(n, r), dklen=64)
+        hash_ = base64.b64encode(hash_).decode("ascii").strip()
+        return "%s$%d$%s$%d$%d$%s" % (self.algorithm, n, salt, r, p, hash_)
+
+    @staticmethod
+    def memory_limit(n, r):
+        # Scrypt needs about 128 * N * r bytes; leave headroom over OpenSSL's 32 MiB default.
+        return 2 * 128 * n * r
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """
+        Argon2 hasher whose cost comes from the ARGON2_* settings. Needs argon2-cffi.
+    """
+
+    @property
+    def time_cost(self):
+        return settings.ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.ARGON2_PARALLELISM
@@ -0,0 +1,107 @@
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+RENDITION_SIZES = (48, 128, 300)
+RENDITION_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+RENDITION_DIR = "profile_pics/renditions"
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def hash_image(field_file):
+    """
+        Return the SHA-256 of an image's content, or an empty string when the file cannot be read.
+
+        :param field_file: The FieldFile of the image, stored or freshly uploaded.
+    """
+    digest = hashlib.sha256()
+    try:
+        for chunk in field_file.chunks():
+            digest.update(chunk)
+    except (OSError, ValueError):
+        logger.warning("Could not read image %s", field_file.name)
+        return ""
+    return digest.hexdigest()
+
+
+def render_image(name, image_hash):
+    """
+        Write every rendition of an image and return their storage names.
+        Renditions are named after the content hash, so existing ones are reused.
+
+        :param name: Storage name of the original image.
+        :param image_hash: Content hash of the original image.
+        :return: {size: {format: name}}, empty when the original cannot be opened.
+    """
+    try:
+        with default_storage.open(name, "rb") as file:
+            original = ImageOps.exif_transpose(Image.open(file))
+            original.load()
+    except (OSError, UnidentifiedImageError):
+        logger.warning("Could not render image %s", name)
+        return {}
+
+    renditions = {}
+    for size in RENDITION_SIZES:
+        resized = original.copy()
+        resized.thumbnail((size, size))
+        for extension, image_format in RENDITION_FORMATS.items():
+            rendition_name = f"{RENDITION_DIR}/{image_hash}_{size}.{extension}"
+            if not default_storage.exists(rendition_name):
+                output = io.BytesIO()
+                image = resized.convert("RGB") if image_format == "JPEG" else resized
+                image.save(output, format=image_format, quality=85)
+                default_storage.save(rendition_name, ContentFile(output.getvalue()))
+            renditions.setdefault(str(size), {})[extension] = rendition_name
+    return renditions
+
+
+def render_profile_image(profile_model, pk, name, image_hash):
+    """
+        Render a profile image and record the renditions, unless the image was replaced meanwhile.
+    """
+    renditions = render_image(name, image_hash)
+    if renditions:
+        profile_model.objects.filter(pk=pk, image_hash=image_hash).update(renditions=renditions)
+
+
+def _render_in_worker(*args):
+    """
+        Run render_profile_image on a pool thread and close the database connection it opened.
+    """
+    try:
+        render_profile_image(*args)
+    finally:
+        connection.close()
+
+
+def schedule_renditions(profile):
+    """
+        Queue the rendering of a profile image on the worker pool. Until it finishes the
+        profile has no renditions and clients use the original image.
+
+        :param profile: The saved Profile whose image_hash was just updated.
+    """
+    args = (type(profile), profile.pk, profile.image.name, profile.image_hash)
+    workers = getattr(settings, "PROFILE_IMAGE_WORKERS", 2)
+    if workers < 1:
+        render_profile_image(*args)
+        return
+
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="profile-image")
+    _executor.submit(_render_in_worker, *args)
@@ -0,0 +1,37 @@
+import os
+import time
+
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ("Measures how many password checks per second one core sustains with each configured hasher, "
+            "which bounds the login throughput at the current cost settings.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20, help="Password checks timed per hasher.")
+        parser.add_argument("--algorithm", action="append", dest="algorithms",
+                            help="Only benchmark this algorithm; repeat for several. All configured by default.")
+
+    def handle(self, *args, **options):
+        iterations = max(options["iterations"], 1)
+        cores = os.cpu_count() or 1
+
+        for hasher in get_hashers():
+            if options["algorithms"] and hasher.algorithm not in options["algorithms"]:
+                continue
+            try:
+                encoded = hasher.encode("Benchmark@123", hasher.salt())
+            except ValueError as e:  # The hasher's library is not installed.
+                self.stdout.write(f"{hasher.algorithm}: unavailable ({e})")
+                continue
+
+            start = time.perf_counter()
+            for _ in range(iterations):
+                hasher.verify("Benchmark@123", encoded)
+            per_login = (time.perf_counter() - start) / iterations
+
+            self.stdout.write(f"{hasher.algorithm}: {per_login * 1000:.1f} ms per login, "
+                              f"{1 / per_login:.1f} logins/sec per core, "
+                              f"{cores / per_login:.1f} logins/sec on {cores} core(s)")
@@ -0,0 +1,43 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.models import CustomUser
+from authentication.utils import IMPORT_CHUNK_SIZE, import_users, read_user_rows
+
+
+class Command(BaseCommand):
+    help = ("Registers users in bulk from a CSV or JSON file with first_name, last_name, email, phone_number, "
+            "role and, for nurses and inventory managers, organization columns. Registration emails are queued "
+            "for send_queued_emails.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSON file to import.")
+        parser.add_argument("--created-by", help="Email of the user recorded as creator of the imported users.")
+        parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE,
+                            help="Number of rows validated and saved together.")
+        parser.add_argument("--hash-workers", type=int, default=None,
+                            help="Processes hashing passwords, the CPU count by default.")
+
+    def handle(self, *args, **options):
+        file_format = os.path.splitext(options["path"])[1].lower().lstrip(".")
+        if file_format not in ("csv", "json"):
+            raise CommandError("The file must have a .csv or .json extension.")
+
+        created_by = None
+        if options["created_by"]:
+            created_by = CustomUser.objects.filter(email=options["created_by"]).first()
+            if created_by is None:
+                raise CommandError(f"No user with email {options['created_by']}.")
+
+        try:
+            with open(options["path"], "rb") as file:
+                created, errors = import_users(read_user_rows(file, file_format), created_by,
+                                               chunk_size=options["chunk_size"],
+                                               hash_workers=options["hash_workers"])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for error in errors:
+            self.stderr.write(f"Row {error['row']}: {error['Error']}")
+        self.stdout.write(self.style.SUCCESS(f"Imported {created} user(s), rejected {len(errors)} row(s)."))
@@ -0,0 +1,48 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from base.utils import claim_queued_emails, deliver_queued_emails
+
+
+class Command(BaseCommand):
+    help = ("Delivers the emails waiting in the outbox. Each worker claims a batch, sends it over one mail "
+            "connection and reschedules failures with exponential backoff.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Number of worker threads sending batches.")
+        parser.add_argument("--batch-size", type=int, default=50, help="Number of emails sent per connection.")
+        parser.add_argument("--max-attempts", type=int, default=5,
+                            help="Attempts after which an email is marked as failed.")
+        parser.add_argument("--poll-interval", type=float, default=0,
+                            help="Seconds to wait for new emails once the outbox is drained; 0 exits instead.")
+
+    def handle(self, *args, **options):
+        while True:
+            if options["workers"] > 1:
+                with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+                    sent = sum(executor.map(lambda _: self.drain(options, close_connection=True),
+                                            range(options["workers"])))
+            else:
+                sent = self.drain(options)
+            self.stdout.write(f"Sent {sent} email(s).")
+
+            if not options["poll_interval"]:
+                break
+            time.sleep(options["poll_interval"])
+
+    @staticmethod
+    def drain(options, close_connection=False):
+        """Sends batches until no email is due and returns how many were sent."""
+        sent = 0
+        try:
+            while True:
+                emails = claim_queued_emails(options["batch_size"])
+                if not emails:
+                    return sent
+                sent += deliver_queued_emails(emails, options["max_attempts"])
+        finally:
+            if close_connection:
+                connection.close()
@@ -1,4 +1,5 @@
 from django.contrib.auth.models import BaseUserManager
+from django.db import transaction
 from authentication.constants import (SUPERUSER_EMAIL_VALIDATION_ERROR)
 
 class CustomUserManager(BaseUserManager):
@@ -25,3 +26,25 @@ class CustomUserManager(BaseUserManager):
         extra_fields.setdefault('is_active', True)
 
         return self.create_user(email, password, **extra_fields)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+            Create users in bulk together with their profiles, since bulk inserts skip the
+            post_save signal that creates the profile of a single user.
+        """
+        with transaction.atomic():
+            users = super().bulk_create(objs, *args, **kwargs)
+            if kwargs.get("ignore_conflicts") or kwargs.get("update_conflicts"):
+                # Rows skipped on conflict were not inserted and cannot own a profile.
+                inserted = set(self.filter(pk__in=[user.pk for user in users]).values_list("pk", flat=True))
+                owners = [user for user in users if user.pk in inserted]
+            else:
+                owners = users
+
+            profile_model = self.model._meta.get_field("profile").related_model
+            profile_model.objects.bulk_create(
+                [profile_model(user=user, created_by_id=user.created_by_id, updated_by_id=user.updated_by_id)
+                 for user in owners],
+                ignore_conflicts=True,
+            )
+        return users
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0004_outboundemail"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="image_hash",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddField(
+            model_name="profile",
+            name="renditions",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
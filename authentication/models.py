@@ -1,14 +1,38 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
+from authentication.images import hash_image, schedule_renditions
 from authentication.manager import CustomUserManager
 from base.models import BaseModel
-from PIL import Image
 from base.constants import (FIELD_SUPPLIER,FIELD_NURSE,FIELD_IM,FIELD_ADMIN)
 from authentication.constants import (DEFAULT_BIO)
 
 
-class CustomUser(AbstractBaseUser,BaseModel,PermissionsMixin):
+class TokenClaimsMixin:
+    """
+        Remembers the loaded values of ``claim_fields`` so a save can tell whether the
+        JWT claims derived from them went stale.
+    """
+    claim_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_claims = instance.claim_values()
+        return instance
+
+    def claim_values(self):
+        return tuple(self.__dict__.get(field) for field in self.claim_fields)
+
+    def claims_changed(self):
+        """Return whether a claim field changed since it was loaded, and remember the current values."""
+        saved = getattr(self, "_saved_claims", None)
+        self._saved_claims = self.claim_values()
+        return saved is not None and saved != self._saved_claims
+
+
+class CustomUser(TokenClaimsMixin,AbstractBaseUser,BaseModel,PermissionsMixin):
     """
         Custom user model.
 
@@ -30,6 +54,7 @@ class CustomUser(AbstractBaseUser,BaseModel,PermissionsMixin):
 
 
     objects = CustomUserManager()
+    claim_fields = ('role', 'is_active')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name','phone_number']
@@ -43,22 +68,74 @@ class Profile(BaseModel):
         Represents a user's profile.
 
         This model extends the BaseModel and stores additional information about a user,
-        including their profile image and a short bio. The profile image is automatically
-        resized upon saving.
+        including their profile image and a short bio. When the image content changes,
+        smaller renditions of it are rendered in the background.
     """
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE ,related_name='profile')
     image = models.ImageField(upload_to='profile_pics/',blank=True,null=True,default='profile_pics/default.jpg')
+    image_hash = models.CharField(max_length=64,blank=True,default='')
+    renditions = models.JSONField(default=dict,blank=True)
     bio = models.TextField(blank=True,null=True,default=DEFAULT_BIO)
 
     def __str__(self):
         return f"{self.user.first_name} {self.user.last_name}'s Profile"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_image = instance.__dict__.get("image")
+        return instance
+
+    def image_changed(self):
+        """Whether the image differs from the stored one (or, for a new profile, from the default)."""
+        saved = getattr(self, "_saved_image", self._meta.get_field("image").default)
+        return bool(self.image) and self.image.name != saved
+
     def save(self, *args, **kwargs):
-        """Resize profile image to max 300x300 on save."""
+        """Queue new renditions once the content of the image really changed."""
+        render = False
+        if self.image_changed():
+            image_hash = hash_image(self.image)
+            render = bool(image_hash) and (image_hash != self.image_hash or not self.renditions)
+            if image_hash != self.image_hash:
+                self.image_hash, self.renditions = image_hash, {}
+                if kwargs.get("update_fields") is not None:
+                    kwargs["update_fields"] = {*kwargs["update_fields"], "image_hash", "renditions"}
+
         super().save(*args, **kwargs)
+        self._saved_image = self.image.name if self.image else None
 
-        if self.image:  # Ensure an image is uploaded
-            img = Image.open(self.image.path)
-            if img.height > 300 or img.width > 300:
-                img.thumbnail((300, 300))
-                img.save(self.image.path)
+        if render:
+            transaction.on_commit(lambda: schedule_renditions(self))
+
+
+class OutboundEmail(BaseModel):
+    """
+        An email waiting in the local outbox.
+
+        Rows are written in the same transaction as the change that triggers them and are
+        delivered later by the ``send_queued_emails`` command, so requests never wait on SMTP.
+        The body is cleared once the email is sent, as it may carry credentials.
+    """
+    STATUS_PENDING = 'Pending'
+    STATUS_SENT = 'Sent'
+    STATUS_FAILED = 'Failed'
+    STATUS_CHOICES = [(STATUS_PENDING,STATUS_PENDING),(STATUS_SENT,STATUS_SENT),(STATUS_FAILED,STATUS_FAILED)]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255, blank=True, null=True)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.status})"
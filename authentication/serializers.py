@@ -1,4 +1,7 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
 from django.utils.crypto import get_random_string
+from django.utils.http import urlsafe_base64_decode
 from rest_framework import serializers
 from authentication.models import CustomUser, Profile
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
@@ -9,7 +12,7 @@ from authentication.constants import (CREDENTIAL_ERROR, BOTH_FILED_REQUIRED, INV
                                       PASSWORD_NOT_MATCH, TOKEN_REQUIRED, INVALID_TOKEN, PASSWORD_RESET_SUCCESS,
                                       ALL_PASSWORD_REQUIRED, NEW_OLD_PASSWORD_NOT_MATCH, INVALID_OLD_PASSWORD,
                                       USER_UN_AUTHENTICATED, )
-from rest_framework_simplejwt.tokens import RefreshToken
+from authentication.tokens import PrincipalRefreshToken
 from django.contrib.auth import authenticate
 from rest_framework import serializers
 
@@ -58,6 +61,22 @@ class UserRegisterSerializer(serializers.ModelSerializer):
         return users
 
 
+class UserImportRowSerializer(serializers.Serializer):
+    """
+        Validates one row of a bulk user import. Uniqueness and organization checks run
+        per chunk in ``import_users`` so they take a few set queries instead of one per row.
+    """
+    first_name = serializers.CharField(max_length=30)
+    last_name = serializers.CharField(max_length=30)
+    email = serializers.EmailField()
+    phone_number = serializers.CharField(max_length=30)
+    role = serializers.ChoiceField(choices=CustomUser.ROLE_CHOICES)
+    organization = serializers.UUIDField(required=False, allow_null=True)
+
+    def validate_email(self, value):
+        return CustomUser.objects.normalize_email(value)
+
+
 class LoginSerializer(serializers.Serializer):
     """
         Serializer for user login.
@@ -92,7 +111,7 @@ class LoginSerializer(serializers.Serializer):
         if not users:
             raise serializers.ValidationError(CREDENTIAL_ERROR)
 
-        refresh = RefreshToken.for_user(users)
+        refresh = PrincipalRefreshToken.for_user(users)
 
 
         return {
@@ -148,12 +167,12 @@ class ForgotPasswordSerializer(serializers.Serializer):
             and sends a password reset email containing a unique token.
 
             Returns:
-                dict: A dictionary containing a success message and the generated token.
+                dict: A dictionary containing a success message, the encoded user id and the generated token.
         """
         email = self.validated_data['email']
         users = CustomUser.objects.get(email=email)
-        token = send_password_reset_email(users, request=self.context.get('request'))
-        return {"message": FORGOT_MAIL_SANDED, "token": token}
+        uid, token = send_password_reset_email(users, request=self.context.get('request'))
+        return {"message": FORGOT_MAIL_SANDED, "uid": uid, "token": token}
 
 
 class PasswordResetSerializer(serializers.Serializer):
@@ -166,10 +185,13 @@ class PasswordResetSerializer(serializers.Serializer):
     new_password = serializers.CharField(write_only=True, max_length=15)
     confirm_password = serializers.CharField(write_only=True, max_length=15)
 
-    def validate(self, data):  # sourcery skip: use-next
+    def validate(self, data):
         """
             Validate the provided data and token.
 
+            The ``uid`` query parameter identifies the user, so the token is
+            checked against that single user instead of every active account.
+
             Args:
                 data (dict): The data containing the new password and confirmation.
 
@@ -180,22 +202,21 @@ class PasswordResetSerializer(serializers.Serializer):
                 serializers.ValidationError: If passwords don't match or the token is invalid.
         """
         request = self.context.get('request')
+        uid = request.query_params.get('uid') if request else None
         token = request.query_params.get('token') if request else None
 
         if data["new_password"] != data["confirm_password"]:
             raise serializers.ValidationError(PASSWORD_NOT_MATCH)
 
-        if not token:
+        if not uid or not token:
             raise serializers.ValidationError(TOKEN_REQUIRED)
 
-        users = None
-
-        for potential_user in CustomUser.objects.filter(is_active=True):
-            if token_generator.check_token(potential_user, token):
-                users = potential_user
-                break
+        try:
+            users = CustomUser.objects.filter(pk=urlsafe_base64_decode(uid).decode(), is_active=True).first()
+        except (TypeError, ValueError, OverflowError, DjangoValidationError):
+            users = None
 
-        if not users:
+        if not users or not token_generator.check_token(users, token):
             raise serializers.ValidationError(INVALID_TOKEN)
 
         self.user = users
@@ -301,24 +322,44 @@ class ProfileSerializer(serializers.ModelSerializer):
     """
 
     user = UserSerializer(partial=True)
+    renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = Profile
-        fields = ["bio", "image", "user"]
+        fields = ["bio", "image", "renditions", "user"]
+
+    def get_renditions(self, instance):
+        """URLs of the resized copies of the image by size and format; empty until they are rendered."""
+        request = self.context.get("request")
+        urls = {}
+        for size, formats in instance.renditions.items():
+            urls[size] = {}
+            for extension, name in formats.items():
+                url = default_storage.url(name)
+                urls[size][extension] = request.build_absolute_uri(url) if request else url
+        return urls
 
     def update(self, instance, validated_data):
+        updated_by = validated_data.pop("updated_by", None)
+
         # Handle nested user update
         if "user" in validated_data:
             user_data = validated_data.pop("user")
             user_instance = instance.user
-            for attr, value in user_data.items():
-                if value is not None:  # Update only if value is provided
-                    setattr(user_instance, attr, value)
-            user_instance.save()
-
-        # Update only provided profile fields
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-
-        instance.save()
+            changed = [attr for attr, value in user_data.items()
+                       if value is not None and getattr(user_instance, attr) != value]
+            if changed:  # Update only if a provided value differs
+                for attr in changed:
+                    setattr(user_instance, attr, user_data[attr])
+                user_instance.save(update_fields=changed + ["updated"])
+
+        # Save the profile only when a provided field changed
+        changed = [attr for attr, value in validated_data.items() if getattr(instance, attr) != value]
+        if changed:
+            for attr in changed:
+                setattr(instance, attr, validated_data[attr])
+            if updated_by is not None:
+                instance.updated_by = updated_by
+                changed.append("updated_by")
+            instance.save(update_fields=changed + ["updated"])
         return instance
@@ -1,6 +1,9 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from inventory_manager.models import Nurse
+from main_admin.models import InventoryManager
 from .models import Profile, CustomUser
+from .tokens import revoke_user_tokens
 
 @receiver(post_save, sender=CustomUser)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -9,6 +12,20 @@ def create_user_profile(sender, instance, created, **kwargs):
         Profile.objects.create(user=instance)  # Create profile with default values
 
 @receiver(post_save, sender=CustomUser)
-def save_user_profile(sender, instance, **kwargs):
-    """Ensure profile is saved when user is saved."""
-    instance.profile.save()
+def revoke_tokens_on_role_change(sender, instance, created, **kwargs):
+    """Revoke the user's refresh tokens once the role or active flag copied into them changes."""
+    if instance.claims_changed() and not created:
+        revoke_user_tokens(instance.pk)
+
+@receiver(post_save, sender=InventoryManager)
+@receiver(post_save, sender=Nurse)
+def revoke_tokens_on_membership_change(sender, instance, created, **kwargs):
+    """Revoke the user's refresh tokens when they join or move to another organization."""
+    if instance.claims_changed() or created:
+        revoke_user_tokens(instance.user_id)
+
+@receiver(post_delete, sender=InventoryManager)
+@receiver(post_delete, sender=Nurse)
+def revoke_tokens_on_membership_removal(sender, instance, **kwargs):
+    """Revoke the user's refresh tokens when they leave their organization."""
+    revoke_user_tokens(instance.user_id)
@@ -1,3 +1,459 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import make_password
+from django.core import mail
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.conf import settings
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from authentication import images
+from authentication.constants import ORGANIZATION_WITHOUT_MANAGER
+from authentication.models import CustomUser, OutboundEmail, Profile
+from authentication.serializers import token_generator
+from authentication.tokens import PrincipalRefreshToken
+from authentication.utils import import_users
+from base.testing import MediaRootTestMixin
+from base.utils import queue_email
+from inventory_manager.models import Nurse
+from main_admin.models import InventoryManager, Organization
+
+
+class AuthenticationTestCase(MediaRootTestMixin, TestCase):
+
+    @classmethod
+    def create_user(cls, index, password="Old@12345"):
+        return CustomUser.objects.create_user(email=f"user{index}@example.com", password=password,
+                                              first_name="User", last_name=str(index),
+                                              phone_number=f"9{index:04}", role="Nurse")
+
+
+class PasswordResetTests(AuthenticationTestCase):
+
+    def reset(self, uid, token, password="New@12345"):
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().post(f"{reverse('reset-password')}?uid={uid}&token={token}",
+                                        {"new_password": password, "confirm_password": password})
+        return response, len(queries)
+
+    def request_reset(self, user):
+        response = APIClient().post(reverse("forgot-password"), {"email": user.email})
+        self.assertEqual(response.status_code, 200)
+        return response.data["uid"], response.data["token"]
+
+    def test_reset_checks_only_the_addressed_user(self):
+        first = self.create_user(0)
+        _, few_users_queries = self.reset(*self.request_reset(first))
+
+        for index in range(1, 40):
+            self.create_user(index)
+        second = CustomUser.objects.get(email="user39@example.com")
+        uid, token = self.request_reset(second)
+        with mock.patch.object(token_generator, "check_token", wraps=token_generator.check_token) as check_token:
+            response, many_users_queries = self.reset(uid, token)
+
+        self.assertEqual(response.status_code, 200)
+        check_token.assert_called_once_with(second, token)
+        self.assertEqual(few_users_queries, many_users_queries)
+        second.refresh_from_db()
+        self.assertTrue(second.check_password("New@12345"))
+
+    def test_token_of_another_user_is_rejected(self):
+        first, second = self.create_user(0), self.create_user(1)
+        first_uid, _ = self.request_reset(first)
+        _, second_token = self.request_reset(second)
+
+        response, _ = self.reset(first_uid, second_token)
+        self.assertEqual(response.status_code, 400)
+        response, _ = self.reset("not-base64", second_token)
+        self.assertEqual(response.status_code, 400)
+
+
+class TokenPrincipalTests(AuthenticationTestCase):
+
+    def setUp(self):
+        self.nurse_user = self.create_user(0)
+        im_user = self.create_user(1)
+        im_user.role = "Inventory Manager"
+        im_user.save()
+        self.organization = Organization.objects.create(name="Org", email="org@example.com", address="Street")
+        self.nurse = Nurse.objects.create(
+            user=self.nurse_user, organization=self.organization,
+            inventory_manager=InventoryManager.objects.create(user=im_user, organization=self.organization))
+
+    def login(self, user):
+        response = APIClient().post(reverse("login"), {"email": user.email, "password": "Old@12345"})
+        self.assertEqual(response.status_code, 200)
+        return response.data["data"]
+
+    def refresh(self, tokens):
+        return APIClient().post(reverse("token_refresh"), {"refresh": tokens["refresh"]})
+
+    def test_requests_are_authorised_from_token_claims(self):
+        tokens = self.login(self.nurse_user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse("request-list"))
+
+        self.assertEqual(response.status_code, 200)
+        tables = " ".join(query["sql"] for query in queries.captured_queries)
+        self.assertNotIn("authentication_customuser", tables)
+        self.assertNotIn("inventory_manager_nurse", tables)
+
+    def test_role_change_revokes_refresh_tokens(self):
+        tokens = self.login(self.nurse_user)
+        self.assertEqual(self.refresh(tokens).status_code, 200)
+
+        tokens = self.login(self.nurse_user)
+        user = CustomUser.objects.get(pk=self.nurse_user.pk)
+        user.first_name = "Renamed"
+        user.save()
+        self.assertEqual(self.refresh(tokens).status_code, 200)
+
+        tokens = self.login(self.nurse_user)
+        user.role = "Supplier"
+        user.save()
+        self.assertEqual(self.refresh(tokens).status_code, 401)
+
+    def test_organization_change_revokes_refresh_tokens(self):
+        tokens = self.login(self.nurse_user)
+        nurse = Nurse.objects.get(pk=self.nurse.pk)
+        nurse.organization = Organization.objects.create(name="Other", email="other@example.com", address="Road")
+        nurse.save()
+        self.assertEqual(self.refresh(tokens).status_code, 401)
+
+    def test_inactive_users_are_rejected(self):
+        CustomUser.objects.filter(pk=self.nurse_user.pk).update(is_active=False)
+        user = CustomUser.objects.get(pk=self.nurse_user.pk)
+        access = PrincipalRefreshToken.for_user(user).access_token
+        without_claim = PrincipalRefreshToken.for_user(user).access_token
+        del without_claim["is_active"]
+
+        for token in (access, without_claim):
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+            self.assertEqual(client.get(reverse("request-list")).status_code, 401)
+
+
+class OutboundEmailTests(AuthenticationTestCase):
+
+    def test_password_reset_email_is_sent_from_the_outbox(self):
+        user = self.create_user(0)
+        response = APIClient().post(reverse("forgot-password"), {"email": user.email})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mail.outbox, [])
+        queued = OutboundEmail.objects.get()
+        self.assertEqual(queued.recipients, [user.email])
+
+        call_command("send_queued_emails", workers=1, stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(response.data["token"], mail.outbox[0].body)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, OutboundEmail.STATUS_SENT)
+        self.assertEqual(queued.body, "")
+
+    def test_failed_emails_back_off_until_the_last_attempt(self):
+        queue_email("Subject", "Body", None, ["someone@example.com"])
+
+        with mock.patch("base.utils.EmailMessage.send", side_effect=OSError("SMTP down")):
+            call_command("send_queued_emails", workers=1, max_attempts=2, stdout=StringIO())
+            queued = OutboundEmail.objects.get()
+            self.assertEqual((queued.status, queued.attempts), (OutboundEmail.STATUS_PENDING, 1))
+            self.assertGreater(queued.next_attempt_at, timezone.now())
+
+            OutboundEmail.objects.update(next_attempt_at=timezone.now())
+            call_command("send_queued_emails", workers=1, max_attempts=2, stdout=StringIO())
+
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (OutboundEmail.STATUS_FAILED, 2))
+        self.assertEqual(queued.last_error, "SMTP down")
+        self.assertEqual(mail.outbox, [])
+
+
+class UserImportTests(AuthenticationTestCase):
+
+    def setUp(self):
+        self.admin = self.create_user(0)
+        self.admin.role = "Admin"
+        self.admin.save()
+        self.organization = Organization.objects.create(name="Org", email="org@example.com", address="Street")
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    @staticmethod
+    def csv_file(rows, name="users.csv"):
+        lines = ["first_name,last_name,email,phone_number,role,organization"]
+        lines += [",".join(str(value) for value in row) for row in rows]
+        upload = StringIO("\n".join(lines))
+        return SimpleUploadedFile(name, upload.getvalue().encode())
+
+    def nurse_rows(self, count, start=100):
+        return [("Nurse", index, f"nurse{index}@example.com", f"8{index:04}", "Nurse", self.organization.pk)
+                for index in range(start, start + count)]
+
+    def upload(self, rows, client=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = (client or self.client).post(reverse("user-import"), {"file": self.csv_file(rows)},
+                                                     format="multipart")
+        return response, len(queries)
+
+    def test_import_creates_users_profiles_links_and_emails(self):
+        rows = [("Head", "Manager", "im@example.com", "70001", "Inventory Manager", self.organization.pk)]
+        rows += self.nurse_rows(3)
+        rows += [
+            ("Taken", "Email", "user0@example.com", "70002", "Supplier", ""),
+            ("Same", "Phone", "dup@example.com", "80100", "Nurse", self.organization.pk),
+            ("No", "Org", "noorg@example.com", "70003", "Nurse", ""),
+        ]
+
+        with mock.patch("authentication.utils.get_random_string", return_value="Known@1234"), \
+                mock.patch("authentication.utils.ProcessPoolExecutor") as process_pool:
+            response, _ = self.upload(rows)
+
+        process_pool.assert_not_called()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["data"]["created"], 4)
+        self.assertEqual([error["row"] for error in response.data["data"]["errors"]], [5, 6, 7])
+        manager = InventoryManager.objects.get(user__email="im@example.com")
+        self.assertEqual(Nurse.objects.filter(inventory_manager=manager, organization=self.organization).count(), 3)
+        self.assertEqual(Profile.objects.filter(user__email__startswith="nurse").count(), 3)
+        self.assertEqual(OutboundEmail.objects.count(), 4)
+        self.assertTrue(CustomUser.objects.get(email="nurse100@example.com").check_password("Known@1234"))
+
+    def test_rolled_back_manager_does_not_validate_later_nurses(self):
+        rows = [
+            {"first_name": "Head", "last_name": "Manager", "email": "im@example.com", "phone_number": "70001",
+             "role": "Inventory Manager", "organization": str(self.organization.pk)},
+            {"first_name": "Ward", "last_name": "Nurse", "email": "nurse@example.com", "phone_number": "70002",
+             "role": "Nurse", "organization": str(self.organization.pk)},
+        ]
+
+        with mock.patch("authentication.utils.build_registration_email", side_effect=IntegrityError("duplicate")):
+            created, errors = import_users(rows, self.admin, chunk_size=1)
+
+        self.assertEqual(created, 0)
+        self.assertEqual(errors[0], {"row": 1, "Error": "duplicate"})
+        self.assertEqual(errors[1], {"row": 2, "Error": {"organization": [ORGANIZATION_WITHOUT_MANAGER]}})
+        self.assertFalse(CustomUser.objects.filter(email__in=["im@example.com", "nurse@example.com"]).exists())
+
+    def test_import_queries_do_not_grow_with_rows(self):
+        manager_user = self.create_user(1)
+        InventoryManager.objects.create(user=manager_user, organization=self.organization)
+
+        small, small_queries = self.upload(self.nurse_rows(5))
+        large, large_queries = self.upload(self.nurse_rows(60, start=200))
+
+        self.assertEqual((small.status_code, large.status_code), (201, 201))
+        self.assertEqual(large.data["data"]["created"], 60)
+        self.assertEqual(small_queries, large_queries)
+
+    def test_inventory_manager_imports_nurses_into_their_organization(self):
+        manager_user = self.create_user(1)
+        manager_user.role = "Inventory Manager"
+        manager_user.save()
+        manager = InventoryManager.objects.create(user=manager_user, organization=self.organization)
+        client = APIClient()
+        client.force_authenticate(manager_user)
+
+        rows = [("Nurse", 1, "nurse1@example.com", "81111", "Nurse", ""),
+                ("Other", "Admin", "admin2@example.com", "81112", "Admin", "")]
+        response, _ = self.upload(rows, client)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["data"]["created"], 1)
+        self.assertEqual(response.data["data"]["errors"][0]["row"], 2)
+        self.assertTrue(Nurse.objects.filter(user__email="nurse1@example.com", inventory_manager=manager).exists())
+
+    def test_command_imports_json_file(self):
+        rows = [{"first_name": "Sup", "last_name": "Plier", "email": "supplier@example.com",
+                 "phone_number": "71111", "role": "Supplier"}]
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as file:
+            json.dump(rows, file)
+        self.addCleanup(os.remove, file.name)
+
+        call_command("import_users", file.name, created_by=self.admin.email, hash_workers=1, stdout=StringIO())
+
+        user = CustomUser.objects.get(email="supplier@example.com")
+        self.assertEqual((user.role, user.created_by_id), ("Supplier", self.admin.pk))
+        self.assertTrue(Profile.objects.filter(user=user).exists())
+
+
+class ProfileSaveTests(AuthenticationTestCase):
+
+    def test_user_save_is_a_single_query(self):
+        user = CustomUser.objects.get(pk=self.create_user(0).pk)
+
+        for fields in ({}, {"update_fields": ["last_login"]}):
+            with self.assertNumQueries(1):
+                user.save(**fields)
+
+    def test_bulk_created_users_get_profiles(self):
+        users = [CustomUser(email=f"bulk{index}@example.com", first_name="Bulk", last_name=str(index),
+                            phone_number=f"6{index:04}", role="Supplier") for index in range(3)]
+
+        with CaptureQueriesContext(connection) as queries:
+            CustomUser.objects.bulk_create(users)
+
+        self.assertEqual(len([query for query in queries.captured_queries if "INSERT" in query["sql"]]), 2)
+        self.assertEqual(Profile.objects.filter(user__in=users).count(), 3)
+
+    def test_image_is_processed_only_when_it_changes(self):
+        profile = Profile.objects.get(user=self.create_user(0))
+
+        with mock.patch("authentication.models.hash_image", return_value="") as hash_image:
+            profile.bio = "Night shift"
+            profile.save()
+            hash_image.assert_not_called()
+
+            profile.image = "profile_pics/new.jpg"
+            profile.save()
+            hash_image.assert_called_once()
+
+    def test_unchanged_profile_update_writes_nothing(self):
+        user = self.create_user(0)
+        client = APIClient()
+        client.force_authenticate(user)
+        payload = {"bio": "Night shift", "user": {"first_name": "Changed"}}
+        self.assertEqual(client.patch(reverse("update"), payload, format="json").status_code, 200)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.patch(reverse("update"), payload, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries.captured_queries if query["sql"].startswith("UPDATE")])
+
+
+@override_settings(PROFILE_IMAGE_WORKERS=0)
+class ProfileImageTests(AuthenticationTestCase):
+
+    def setUp(self):
+        self.user = self.create_user(0)
+        self.client = APIClient()
+
+    def request(self, method, data=None):
+        # A fresh user per request, like token authentication, so the profile is not cached.
+        self.client.force_authenticate(CustomUser.objects.get(pk=self.user.pk))
+        return getattr(self.client, method)(reverse("update"), data, format="multipart")
+
+    @staticmethod
+    def upload(name, size=(600, 400), color="red"):
+        content = BytesIO()
+        Image.new("RGB", size, color).save(content, format="JPEG")
+        return SimpleUploadedFile(name, content.getvalue(), content_type="image/jpeg")
+
+    def test_renditions_are_rendered_after_commit(self):
+        with mock.patch("authentication.images.connection") as image_connection, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.request("patch", {"image": self.upload("photo.jpg")})
+
+        self.assertEqual(response.status_code, 200)
+        image_connection.close.assert_not_called()
+        self.assertEqual(response.data["message"]["renditions"], {})
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual(sorted(profile.renditions, key=int), ["48", "128", "300"])
+        with default_storage.open(profile.renditions["300"]["webp"]) as file:
+            self.assertEqual(Image.open(file).size, (300, 200))
+        with Image.open(os.path.join(self.media_root, profile.image.name)) as original:
+            self.assertEqual(original.size, (600, 400))
+
+        response = self.request("get")
+        self.assertTrue(response.data["message"]["renditions"]["48"]["jpeg"].endswith("_48.jpeg"))
+
+    def test_pool_workers_close_their_connection(self):
+        with override_settings(PROFILE_IMAGE_WORKERS=1), \
+                mock.patch("authentication.images.render_profile_image") as render, \
+                mock.patch("authentication.images.connection") as image_connection:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.request("patch", {"image": self.upload("photo.jpg")})
+            images._executor.shutdown()
+            images._executor = None
+
+        render.assert_called_once()
+        image_connection.close.assert_called_once_with()
+
+    def test_same_content_under_a_new_name_is_not_rendered_again(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.request("patch", {"image": self.upload("photo.jpg")})
+
+        with mock.patch("authentication.models.schedule_renditions") as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.request("patch", {"image": self.upload("copy.jpg")})
+            schedule.assert_not_called()
+        self.assertEqual(len(Profile.objects.get(user=self.user).renditions), 3)
+
+    def test_missing_image_file_is_ignored(self):
+        profile = Profile.objects.get(user=self.user)
+        profile.image = "profile_pics/missing.jpg"
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks, \
+                self.assertLogs("authentication.images", "WARNING"):
+            profile.save()
+
+        self.assertEqual(callbacks, [])
+        profile.refresh_from_db()
+        self.assertEqual((profile.image_hash, profile.renditions), ("", {}))
+
+
+class LoginHasherTests(AuthenticationTestCase):
+
+    def login(self, email, password="Old@12345"):
+        return APIClient().post(reverse("login"), {"email": email, "password": password})
+
+    def test_login_upgrades_hashes_to_the_configured_hasher(self):
+        user = self.create_user(0)
+        CustomUser.objects.filter(pk=user.pk).update(password=make_password("Old@12345", hasher="pbkdf2_sha256"))
+
+        with override_settings(SCRYPT_WORK_FACTOR=2 ** 12):
+            self.assertEqual(self.login(user.email).status_code, 200)
+            user.refresh_from_db()
+            self.assertTrue(user.password.startswith("scrypt$4096$"))
+
+            with self.assertNumQueries(0):
+                self.assertTrue(user.check_password("Old@12345"))
+
+        self.assertEqual(self.login(user.email).status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith(f"scrypt${settings.SCRYPT_WORK_FACTOR}$"))
+
+    def test_login_verifies_hashes_made_with_a_higher_cost(self):
+        user = self.create_user(0)
+        with override_settings(SCRYPT_WORK_FACTOR=2 ** 15, SCRYPT_BLOCK_SIZE=8):
+            CustomUser.objects.filter(pk=user.pk).update(password=make_password("Old@12345", hasher="scrypt"))
+
+        with override_settings(SCRYPT_WORK_FACTOR=2 ** 14, SCRYPT_BLOCK_SIZE=4):
+            self.assertEqual(self.login(user.email).status_code, 200)
+            user.refresh_from_db()
+            self.assertTrue(user.password.startswith("scrypt$16384$"))
+            self.assertEqual(user.password.split("$")[3], "4")
+            self.assertTrue(user.check_password("Old@12345"))
+
+    def test_unknown_email_still_hashes_the_password(self):
+        with mock.patch.object(CustomUser, "set_password", autospec=True) as set_password:
+            response = self.login("nobody@example.com")
+
+        self.assertEqual(response.status_code, 400)
+        set_password.assert_called_once_with(mock.ANY, "Old@12345")
+
+    def test_benchmark_reports_each_hasher(self):
+        out = StringIO()
+        call_command("benchmark_hashers", iterations=1, algorithm=["scrypt", "pbkdf2_sha256"], stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split(":")[0] for line in lines], ["scrypt", "pbkdf2_sha256"])
+        self.assertIn("logins/sec per core", lines[0])
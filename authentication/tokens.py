@@ -0,0 +1,125 @@
+import uuid
+
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from authentication.models import CustomUser
+from base.constants import FIELD_IM, FIELD_NURSE
+
+ID_CLAIMS = ("organization_id", "inventory_manager_id", "nurse_id")
+
+
+def principal_claims(user):
+    """
+        Collect the role, active flag and organization claims of a user from the database.
+
+        :param user: The CustomUser the claims describe.
+        :return: A dict with the role, is_active and the organization, inventory manager and nurse ids
+                 (None when not set).
+    """
+    claims = dict.fromkeys(ID_CLAIMS)
+    claims["role"] = user.role
+    claims["is_active"] = user.is_active
+
+    if user.role == FIELD_IM:
+        membership = user.inventorymanager_set.values("id", "organization_id").first()
+        id_claim = "inventory_manager_id"
+    elif user.role == FIELD_NURSE:
+        membership = user.nurse_set.values("id", "organization_id").first()
+        id_claim = "nurse_id"
+    else:
+        membership = None
+
+    if membership:
+        claims[id_claim] = membership["id"]
+        claims["organization_id"] = membership["organization_id"]
+    return claims
+
+
+def user_claims(user):
+    """
+        Return the principal claims of the request user.
+
+        A TokenPrincipal answers from its token; any other user falls back to one lookup.
+
+        :param user: The authenticated request user.
+        :return: A dict with the role, is_active and the organization, inventory manager and nurse ids.
+    """
+    if type(user) is TokenPrincipal:
+        return user.claims
+    return principal_claims(user)
+
+
+def revoke_user_tokens(user_id):
+    """
+        Blacklist every outstanding refresh token of a user so the claims copied into them
+        can no longer be refreshed; the next login issues tokens with the current values.
+
+        :param user_id: Primary key of the user whose tokens are revoked.
+    """
+    outstanding = OutstandingToken.objects.filter(user_id=user_id, expires_at__gt=timezone.now(),
+                                                  blacklistedtoken__isnull=True).only("id")
+    BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in outstanding],
+                                         ignore_conflicts=True)
+
+
+class PrincipalRefreshToken(RefreshToken):
+    """
+        Refresh token carrying the role and organization claims of its user.
+
+        The claims are copied into every access token derived from it, so requests can be
+        authorised without loading the user.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim, value in principal_claims(user).items():
+            token[claim] = str(value) if value is not None and claim in ID_CLAIMS else value
+        return token
+
+
+class TokenPrincipal(SimpleLazyObject):
+    """
+        Request user resolved from the claims of a validated access token.
+
+        The id, role, active flag and organization claims are answered without touching the database.
+        Reading any other attribute loads the CustomUser once and proxies to it.
+    """
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, token):
+        user_id = token[api_settings.USER_ID_CLAIM]
+        super().__init__(lambda: self.load_user(user_id))
+        self.__dict__["user_id"] = uuid.UUID(str(user_id))
+        self.__dict__["claims"] = {
+            "role": token["role"],
+            "is_active": token["is_active"],
+            **{claim: uuid.UUID(token[claim]) if token.get(claim) else None for claim in ID_CLAIMS},
+        }
+
+    @staticmethod
+    def load_user(user_id):
+        try:
+            return CustomUser.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        except CustomUser.DoesNotExist:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+
+    @property
+    def pk(self):
+        return self.user_id
+
+    id = pk
+
+    @property
+    def role(self):
+        return self.claims["role"]
+
+    @property
+    def is_active(self):
+        return self.claims["is_active"]
@@ -1,9 +1,10 @@
 from django.urls import path
 from authentication.views import (RegisterView, LoginView, ForgotPasswordView, PasswordResetConfirmView,
-                                  PasswordChangeView, LogoutAPIView, ProfileUpdateView)
+                                  PasswordChangeView, LogoutAPIView, ProfileUpdateView, UserImportView)
 
 urlpatterns = [
     path('v1/user/register',RegisterView.as_view(),name='register'),
+    path('v1/user/import',UserImportView.as_view(),name='user-import'),
     path('v1/user/login',LoginView.as_view(),name='login'),
     path('v1/user/forgot-password',ForgotPasswordView.as_view(),name='forgot-password'),
     path('v1/user/reset-password/',PasswordResetConfirmView.as_view(),name='reset-password'),
@@ -0,0 +1,207 @@
+import codecs
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from django.utils.crypto import get_random_string
+
+from authentication.constants import (EMAIL_ALREADY_EXISTS, INVALID_IMPORT_JSON, NURSES_ONLY_IMPORT,
+                                      ORGANIZATION_NOT_FOUND, ORGANIZATION_REQUIRED, ORGANIZATION_WITHOUT_MANAGER,
+                                      PHONE_ALREADY_EXISTS)
+from authentication.models import CustomUser, OutboundEmail
+from authentication.serializers import UserImportRowSerializer
+from base.constants import FIELD_IM, FIELD_NURSE
+from base.utils import build_registration_email
+from inventory_manager.models import Nurse
+from main_admin.models import InventoryManager, Organization
+
+IMPORT_CHUNK_SIZE = 500
+
+
+def read_user_rows(file, file_format):
+    """
+        Yield the rows of an uploaded user file as dicts, dropping empty cells.
+
+        :param file: Binary file object holding the CSV or JSON document.
+        :param file_format: "csv" or "json".
+    """
+    if file_format == "json":
+        rows = json.load(file)
+        if not isinstance(rows, list):
+            raise ValueError(INVALID_IMPORT_JSON)
+    else:
+        rows = csv.DictReader(codecs.iterdecode(file, "utf-8-sig"))
+
+    for row in rows:
+        if not isinstance(row, dict):
+            yield row
+            continue
+        yield {key: value.strip() if isinstance(value, str) else value
+               for key, value in row.items() if key and value not in ("", None)}
+
+
+@contextmanager
+def password_hasher(workers=None):
+    """
+        Provide a function hashing a list of passwords, spread over a process pool.
+
+        :param workers: Number of processes; the CPU count when None, hashing inline when 1 or less.
+    """
+    workers = os.cpu_count() if workers is None else workers
+    if workers <= 1:
+        yield lambda passwords: [make_password(password) for password in passwords]
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+        yield lambda passwords: list(executor.map(make_password, passwords,
+                                                  chunksize=max(1, len(passwords) // workers)))
+
+
+def import_users(rows, created_by, inventory_manager=None, chunk_size=IMPORT_CHUNK_SIZE, hash_workers=1):
+    """
+        Create users from an iterable of rows in chunks. Each chunk is validated against the
+        existing users with a few set queries and saved with bulk inserts of the users (with
+        their profiles), their Nurse/InventoryManager links and their registration emails.
+
+        :param rows: Iterable of dicts with first_name, last_name, email, phone_number, role and,
+                     for nurses and inventory managers, organization.
+        :param created_by: The user running the import.
+        :param inventory_manager: InventoryManager importing nurses into their own organization,
+                                  or None for an admin import.
+        :param chunk_size: Number of rows validated and saved together.
+        :param hash_workers: Processes hashing the generated passwords (see password_hasher). Hashing
+                             stays inline by default, as forking a web worker that may run threads is
+                             unsafe; only the import_users command starts a pool.
+        :return: The number of users created and a list of per-row errors.
+    """
+    state = {"emails": set(), "phones": set(), "managers": {}}
+    created, errors = 0, []
+    numbered = enumerate(rows, start=1)
+
+    with password_hasher(hash_workers) as hash_passwords:
+        while chunk := list(islice(numbered, chunk_size)):
+            valid = validate_import_chunk(chunk, inventory_manager, state, errors)
+            if not valid:
+                continue
+            try:
+                created += create_imported_users(valid, created_by, inventory_manager, state, hash_passwords)
+            except IntegrityError as e:
+                # Another request registered one of these users since the chunk was validated.
+                errors += [{"row": number, "Error": str(e)} for number, _ in valid]
+                continue
+            # Only rows of committed chunks block duplicates in later chunks.
+            state["emails"].update(data["email"] for _, data in valid)
+            state["phones"].update(data["phone_number"] for _, data in valid)
+    return created, errors
+
+
+def validate_import_chunk(chunk, inventory_manager, state, errors):
+    """
+        Validate a chunk of numbered rows and return the valid ones as (row number, data) pairs.
+        Invalid rows are appended to errors. The state is only read here, apart from the managers
+        found in the database; the caller records the chunk's users once it is committed.
+    """
+    parsed = []
+    for number, row in chunk:
+        serializer = UserImportRowSerializer(data=row if isinstance(row, dict) else {})
+        if serializer.is_valid():
+            parsed.append((number, serializer.validated_data))
+        else:
+            errors.append({"row": number, "Error": serializer.errors})
+
+    taken_emails = set(CustomUser.objects.filter(email__in=[data["email"] for _, data in parsed])
+                       .values_list("email", flat=True))
+    taken_phones = set(CustomUser.objects.filter(phone_number__in=[data["phone_number"] for _, data in parsed])
+                       .values_list("phone_number", flat=True))
+
+    organization_ids = {data.get("organization") for _, data in parsed} - {None}
+    if inventory_manager is None and organization_ids:
+        known_organizations = set(Organization.objects.filter(pk__in=organization_ids)
+                                  .values_list("pk", flat=True))
+        for organization_id, manager_id in (InventoryManager.objects.filter(organization_id__in=organization_ids)
+                                            .order_by("-created").values_list("organization_id", "id")):
+            state["managers"].setdefault(organization_id, manager_id)
+    else:
+        known_organizations = set()
+
+    emails, phones, pending_managers = set(), set(), set()
+    valid = []
+    for number, data in parsed:
+        error = None
+        if data["email"] in taken_emails or data["email"] in state["emails"] or data["email"] in emails:
+            error = {"email": [EMAIL_ALREADY_EXISTS]}
+        elif data["phone_number"] in taken_phones or data["phone_number"] in state["phones"] \
+                or data["phone_number"] in phones:
+            error = {"phone_number": [PHONE_ALREADY_EXISTS]}
+        elif inventory_manager is not None:
+            if data["role"] != FIELD_NURSE:
+                error = {"role": [NURSES_ONLY_IMPORT]}
+        elif data["role"] in (FIELD_NURSE, FIELD_IM):
+            organization_id = data.get("organization")
+            if organization_id is None:
+                error = {"organization": [ORGANIZATION_REQUIRED]}
+            elif organization_id not in known_organizations:
+                error = {"organization": [ORGANIZATION_NOT_FOUND]}
+            elif data["role"] == FIELD_IM:
+                pending_managers.add(organization_id)
+            elif organization_id not in state["managers"] and organization_id not in pending_managers:
+                error = {"organization": [ORGANIZATION_WITHOUT_MANAGER]}
+
+        if error:
+            errors.append({"row": number, "Error": error})
+            continue
+        emails.add(data["email"])
+        phones.add(data["phone_number"])
+        valid.append((number, data))
+    return valid
+
+
+def create_imported_users(valid, created_by, inventory_manager, state, hash_passwords):
+    """
+        Save a validated chunk with bulk inserts and queue the registration emails. The managers it
+        creates are only recorded in the state once the chunk is committed.
+
+        :return: The number of users created.
+    """
+    passwords = [get_random_string(10) for _ in valid]
+    users = [
+        CustomUser(email=data["email"], first_name=data["first_name"], last_name=data["last_name"],
+                   phone_number=data["phone_number"], role=data["role"], is_first_time_login=True,
+                   password=hashed, created_by=created_by, updated_by=created_by)
+        for (_, data), hashed in zip(valid, hash_passwords(passwords))
+    ]
+
+    with transaction.atomic():
+        CustomUser.objects.bulk_create(users)
+
+        managers = [InventoryManager(user=user, organization_id=data["organization"], created_by=created_by,
+                                     updated_by=created_by)
+                    for user, (_, data) in zip(users, valid) if data["role"] == FIELD_IM]
+        InventoryManager.objects.bulk_create(managers)
+        organization_managers = dict(state["managers"])
+        for manager in managers:
+            organization_managers.setdefault(manager.organization_id, manager.pk)
+
+        nurses = []
+        for user, (_, data) in zip(users, valid):
+            if data["role"] != FIELD_NURSE:
+                continue
+            if inventory_manager is not None:
+                organization_id, manager_id = inventory_manager.organization_id, inventory_manager.pk
+            else:
+                organization_id = data["organization"]
+                manager_id = organization_managers[organization_id]
+            nurses.append(Nurse(user=user, organization_id=organization_id, inventory_manager_id=manager_id,
+                                created_by=created_by, updated_by=created_by))
+        Nurse.objects.bulk_create(nurses)
+
+        OutboundEmail.objects.bulk_create([build_registration_email(user, password)
+                                           for user, password in zip(users, passwords)])
+    state["managers"] = organization_managers
+    return len(users)
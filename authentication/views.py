@@ -1,5 +1,9 @@
+import csv
+import os
+
 from django.contrib.auth import get_user_model
 from rest_framework import generics, status, mixins, permissions
+from rest_framework.parsers import MultiPartParser
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 from authentication.models import CustomUser
@@ -13,7 +17,10 @@ from base.constants import (FIELD_ADMIN, FIELD_IM)
 from authentication.constants import (USER_CREATED_SUCCESS, USER_REGISTRATION_FAILED, USER_LOGGED_IN, USER_LOGIN_FAILED,
                                       FORGOT_PASSWORD_FAILED, PASSWORD_RESET_FAILED, CHANGE_PASSWORD_FAILED,
                                       USER_LOGGED_OUT, ALREADY_USER_LOGGED_OUT, PROFILE_UPDATE_FAILED,
-                                      PROFILE_UPDATE_SUCCESS, PROFILE_FETCH_SUCCESSFULLY)
+                                      PROFILE_UPDATE_SUCCESS, PROFILE_FETCH_SUCCESSFULLY, USERS_IMPORTED,
+                                      USER_IMPORT_FAILED, INVALID_IMPORT_FILE)
+from authentication.utils import import_users, read_user_rows
+from main_admin.models import InventoryManager
 from main_admin.utils import success_response, error_response
 
 user = get_user_model()
@@ -38,6 +45,46 @@ class RegisterView(generics.CreateAPIView):
         return error_response(serializer.errors, USER_REGISTRATION_FAILED, status.HTTP_400_BAD_REQUEST)
 
 
+class UserImportView(generics.GenericAPIView):
+    """
+    Registers users in bulk from an uploaded CSV or JSON file.
+
+    Admins may import any role; nurses and inventory managers need an organization column.
+    Inventory managers may only import nurses, who join their organization.
+    """
+    permission_classes = [IsAuthenticated, RoleBasedPermission]
+    allowed_roles = [FIELD_ADMIN, FIELD_IM]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        """
+            Imports the users of the uploaded file.
+
+            Returns:
+                Response: The number of users created and the errors of the rejected rows.
+        """
+        upload = request.FILES.get('file')
+        file_format = os.path.splitext(upload.name)[1].lower().lstrip('.') if upload else None
+        if file_format not in ('csv', 'json'):
+            return error_response({"file": [INVALID_IMPORT_FILE]}, USER_IMPORT_FAILED, status.HTTP_400_BAD_REQUEST)
+
+        inventory_manager = None
+        if request.user.role == FIELD_IM:
+            inventory_manager = InventoryManager.objects.filter(user=request.user).first()
+            if inventory_manager is None:
+                return error_response("Inventory Manager not found for the current user.", USER_IMPORT_FAILED,
+                                      status.HTTP_400_BAD_REQUEST)
+
+        try:
+            created, errors = import_users(read_user_rows(upload, file_format), request.user, inventory_manager)
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            return error_response({"file": [str(e)]}, USER_IMPORT_FAILED, status.HTTP_400_BAD_REQUEST)
+
+        if not created:
+            return error_response(errors, USER_IMPORT_FAILED, status.HTTP_400_BAD_REQUEST)
+        return success_response(USERS_IMPORTED, {"created": created, "errors": errors}, status.HTTP_201_CREATED)
+
+
 class LoginView(generics.GenericAPIView):
     """
     Logs in an existing user.
@@ -1,16 +1,122 @@
-from rest_framework.pagination import LimitOffsetPagination
+from django.conf import settings
+from django.db import connections
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
 from rest_framework.response import Response
 
+
+def estimated_count(queryset):
+    """
+    Returns the planner's row estimate for the table behind an unfiltered queryset.
+
+    Uses ``pg_class.reltuples`` on PostgreSQL and ``MAX(rowid)`` on SQLite. Returns
+    None for filtered querysets, other backends and tables that were never analyzed.
+
+    :param queryset: QuerySet being paginated
+    :return: estimated number of rows or None
+    """
+    query = queryset.query
+    if query.where or query.distinct or query.combinator:
+        return None
+
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f"SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}")
+        else:
+            return None
+        row = cursor.fetchone()
+
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def count_rows(queryset, view):
+    """
+    Counts the rows of a paginated queryset.
+
+    Views that set ``estimate_count = True`` get the planner's estimate instead of
+    an exact COUNT(*) once it reaches PAGINATION_ESTIMATED_COUNT_THRESHOLD rows.
+
+    :param queryset: QuerySet being paginated
+    :param view: view being paginated
+    :return: tuple of (count, whether the count is estimated)
+    """
+    if getattr(view, 'estimate_count', False):
+        estimate = estimated_count(queryset)
+        if estimate is not None and estimate >= settings.PAGINATION_ESTIMATED_COUNT_THRESHOLD:
+            return estimate, True
+    return queryset.count(), False
+
+
 class MyLimitOffsetPagination(LimitOffsetPagination):
     default_limit = 5
 
+    def get_count(self, queryset):
+        self.count_estimated = False
+        if not hasattr(queryset, 'query'):
+            return super().get_count(queryset)
+        count, self.count_estimated = count_rows(queryset, self.request.parser_context.get('view'))
+        return count
+
+    def get_paginated_response(self, data):
+        view = self.request.parser_context.get('view')
+        message = getattr(view, 'pagination_message', "Data retrieved successfully.")
+
+        return Response({
+            "message": message,
+            "count": self.count,
+            "count_estimated": self.count_estimated,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "data": data
+        })
+
+
+class MyCursorPagination(CursorPagination):
+    """
+        Cursor pagination ordered on (-created, -id) with the same envelope as MyLimitOffsetPagination.
+
+        DRF positions the cursor on ``created`` alone: pages are fetched with a WHERE on
+        the last seen ``created`` value plus a small offset over rows sharing it, and ``id``
+        only keeps the order of such rows stable. The first page carries the total ``count``
+        as before unless ``?count=false`` is sent; later pages skip it unless ``?count=true``
+        is sent, so clients following ``next`` links get a null count from the second page on.
+        Requests that still send ``offset`` are served by MyLimitOffsetPagination so
+        existing clients keep working while a view opts in.
+    """
+    page_size = 5
+    page_size_query_param = 'limit'
+    max_page_size = 500
+    ordering = ('-created', '-id')
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.offset_pagination = None
+        if LimitOffsetPagination.offset_query_param in request.query_params:
+            self.offset_pagination = MyLimitOffsetPagination()
+            return self.offset_pagination.paginate_queryset(queryset, request, view)
+
+        self.count, self.count_estimated = None, False
+        count = request.query_params.get(self.count_query_param, '').lower()
+        if count == 'true' or (count != 'false' and not request.query_params.get(self.cursor_query_param)):
+            self.count, self.count_estimated = count_rows(queryset, view)
+        return super().paginate_queryset(queryset, request, view)
+
     def get_paginated_response(self, data):
+        if self.offset_pagination is not None:
+            return self.offset_pagination.get_paginated_response(data)
+
         view = self.request.parser_context.get('view')
         message = getattr(view, 'pagination_message', "Data retrieved successfully.")
 
         return Response({
             "message": message,
             "count": self.count,
+            "count_estimated": self.count_estimated,
             "next": self.get_next_link(),
             "previous": self.get_previous_link(),
             "data": data
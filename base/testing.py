@@ -0,0 +1,26 @@
+import os
+import shutil
+import tempfile
+
+from django.test import override_settings
+from PIL import Image
+
+
+class MediaRootTestMixin:
+    """
+    Runs a test case against a temporary MEDIA_ROOT holding the default profile picture,
+    so creating users does not depend on (or write to) the project's media directory.
+    The directory is removed once the test case has finished.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.media_root, ignore_errors=True)
+        os.makedirs(os.path.join(cls.media_root, "profile_pics"))
+        Image.new("RGB", (10, 10)).save(os.path.join(cls.media_root, "profile_pics", "default.jpg"))
+
+        media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        media_settings.enable()
+        cls.addClassCleanup(media_settings.disable)
+        super().setUpClass()
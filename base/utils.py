@@ -1,14 +1,105 @@
-from django.core.mail import send_mail
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from authentication.models import OutboundEmail
 
 CustomUser = get_user_model()
 token_generator = PasswordResetTokenGenerator()
+EMAIL_RETRY_BACKOFF = timedelta(seconds=30)
+EMAIL_MAX_BACKOFF = timedelta(hours=1)
+
+def queue_email(subject, message, from_email, recipient_list):
+    """
+    Adds an email to the outbox. It is written in the caller's transaction, so it is only
+    sent if that transaction commits; the send_queued_emails command delivers it.
+
+    :param subject: Subject line
+    :param message: Plain text body
+    :param from_email: Sender address, the default sender when None
+    :param recipient_list: List of recipient addresses
+    """
+    return OutboundEmail.objects.create(subject=subject, body=message, from_email=from_email,
+                                        recipients=list(recipient_list))
+
+def claim_queued_emails(batch_size, lease=timedelta(minutes=5)):
+    """
+    Claims a batch of due emails for one worker. The claimed rows are pushed past the lease
+    so other workers skip them; a worker that dies leaves them to be retried after it.
+
+    :param batch_size: Maximum number of emails to claim
+    :param lease: How long the claim holds before the emails become due again
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboundEmail.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at")[:batch_size]
+        )
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in emails]).update(next_attempt_at=now + lease)
+    return emails
+
+def deliver_queued_emails(emails, max_attempts):
+    """
+    Sends a claimed batch over a single mail connection and records the outcome of each email.
+    Failed emails are retried with exponential backoff until max_attempts is reached.
+
+    :param emails: OutboundEmail instances returned by claim_queued_emails
+    :param max_attempts: Number of attempts after which an email is marked as failed
+    :return: Number of emails sent
+    """
+    sent, errors = [], {}
+    try:
+        with get_connection(fail_silently=False) as connection:
+            for email in emails:
+                try:
+                    EmailMessage(email.subject, email.body, email.from_email, email.recipients,
+                                 connection=connection).send()
+                except Exception as e:
+                    errors[email.pk] = e
+                else:
+                    sent.append(email.pk)
+    except Exception as e:
+        # Opening or closing the connection failed: whatever was not sent is retried.
+        errors.update({email.pk: e for email in emails if email.pk not in sent and email.pk not in errors})
+
+    now = timezone.now()
+    OutboundEmail.objects.filter(pk__in=sent).update(status=OutboundEmail.STATUS_SENT, sent_at=now, body="",
+                                                     last_error="", updated=now)
+
+    failed = [email for email in emails if email.pk in errors]
+    for email in failed:
+        email.attempts += 1
+        email.last_error = str(errors[email.pk])
+        if email.attempts >= max_attempts:
+            email.status = OutboundEmail.STATUS_FAILED
+        else:
+            email.next_attempt_at = now + min(EMAIL_RETRY_BACKOFF * 2 ** (email.attempts - 1), EMAIL_MAX_BACKOFF)
+        email.updated = now
+    OutboundEmail.objects.bulk_update(failed, ["attempts", "last_error", "status", "next_attempt_at", "updated"])
+    return len(sent)
 
 def send_registration_email(user, raw_password):
     """
-    Sends a registration email with login credentials.
+    Queues a registration email with login credentials.
+
+    :param user: CustomUser instance (Registered User)
+    :param raw_password: Generated password for the user
+    """
+    build_registration_email(user, raw_password).save()
+
+def build_registration_email(user, raw_password):
+    """
+    Builds the unsaved outbox entry of a registration email, so bulk imports can queue many at once.
 
     :param user: CustomUser instance (Registered User)
     :param raw_password: Generated password for the user
@@ -32,17 +123,15 @@ def send_registration_email(user, raw_password):
     **Medivault Team**
     """
 
-    try:
-        send_mail(subject, message, settings.EMAIL_HOST_USER, [user.email], fail_silently=False)
-    except Exception as e:
-        raise f"Failed to send email to {user.email} " from e
+    return OutboundEmail(subject=subject, body=message, from_email=settings.EMAIL_HOST_USER, recipients=[user.email])
 
 def send_password_reset_email(user, request=None):
     if not isinstance(user, CustomUser):
         raise ValueError("User must be an instance of CustomUser")
 
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
     token = token_generator.make_token(user)
-    reset_link = f"localhost:8000/api/v1/user/reset-password/?token={token}"
+    reset_link = f"localhost:8000/api/v1/user/reset-password/?uid={uid}&token={token}"
 
     subject = "Password Reset Request"
     message = f"""
@@ -57,8 +146,16 @@ def send_password_reset_email(user, request=None):
     from_email = settings.DEFAULT_FROM_EMAIL
     recipient_list = [user.email]
 
-    try:
-        send_mail(subject, message, from_email, recipient_list, fail_silently=False,)
-    except Exception as e:
-        raise f"Failed to send email to {user.email} " from e
-    return token
\ No newline at end of file
+    queue_email(subject, message, from_email, recipient_list)
+    return uid, token
+
+def value_per_row(values, output_field=None):
+    """
+    Builds a CASE expression that maps each primary key to its own value, so rows
+    that need different amounts can be changed with a single UPDATE.
+
+    :param values: dict of primary key -> value
+    :param output_field: model field type of the values, IntegerField by default
+    """
+    return Case(*[When(pk=pk, then=Value(value)) for pk, value in values.items()],
+                output_field=output_field or IntegerField())
@@ -57,12 +57,20 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.backends.PrincipalJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication'
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
 }
 
+# Views with estimate_count = True report the planner's row estimate instead of
+# an exact COUNT(*) for unfiltered listings at or above this many rows.
+PAGINATION_ESTIMATED_COUNT_THRESHOLD = 100000
+
+# Threads rendering profile image renditions after the upload commits; 0 renders
+# them in the committing thread instead.
+PROFILE_IMAGE_WORKERS = 2
+
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=1),
@@ -140,6 +148,26 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# New passwords are hashed with the first hasher; the others verify existing hashes,
+# which are upgraded on the next successful login. PASSWORD_HASHER=argon2 selects
+# Argon2 instead of scrypt (requires argon2-cffi). Run `manage.py benchmark_hashers`
+# to see the logins/sec per core a cost setting allows.
+PASSWORD_HASHERS = [
+    "authentication.hashers.ScryptPasswordHasher",
+    "authentication.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+]
+if os.getenv('PASSWORD_HASHER') == 'argon2':
+    PASSWORD_HASHERS.insert(0, PASSWORD_HASHERS.pop(1))
+
+SCRYPT_WORK_FACTOR = int(os.getenv('SCRYPT_WORK_FACTOR', 2 ** 15))
+SCRYPT_BLOCK_SIZE = int(os.getenv('SCRYPT_BLOCK_SIZE', 8))
+SCRYPT_PARALLELISM = int(os.getenv('SCRYPT_PARALLELISM', 1))
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', 65536))
+ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', 1))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
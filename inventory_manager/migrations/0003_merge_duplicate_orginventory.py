@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:25
+
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_org_inventory(apps, schema_editor):
+    """
+    Collapses OrgInventory rows that share an (inventory, organization) pair into
+    the oldest row so the unique constraint added next can be created.
+    """
+    OrgInventory = apps.get_model("inventory_manager", "OrgInventory")
+    RequestedItems = apps.get_model("nurse", "RequestedItems")
+
+    duplicates = (
+        OrgInventory.objects.values("inventory_id", "organization_id")
+        .annotate(rows=Count("id"), stock=Sum("quantity_in_stock"))
+        .filter(rows__gt=1)
+    )
+    for duplicate in duplicates:
+        rows = OrgInventory.objects.filter(
+            inventory_id=duplicate["inventory_id"],
+            organization_id=duplicate["organization_id"],
+        ).order_by("created")
+        keeper = rows.first()
+        others = rows.exclude(pk=keeper.pk)
+        RequestedItems.objects.filter(inventory__in=others).update(inventory=keeper)
+        others.delete()
+        keeper.quantity_in_stock = duplicate["stock"]
+        keeper.save(update_fields=["quantity_in_stock"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory_manager", "0002_orginventory"),
+        ("nurse", "0004_requesteditems_quantity_returned"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_org_inventory, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory_manager", "0003_merge_duplicate_orginventory"),
+        ("main_admin", "0004_alter_inventorymanager_user"),
+        ("supplier", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="orginventory",
+            constraint=models.UniqueConstraint(
+                fields=("inventory", "organization"), name="unique_org_inventory"
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory_manager", "0004_orginventory_unique_org_inventory"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orginventory",
+            name="emergency_reserve",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
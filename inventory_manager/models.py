@@ -1,16 +1,18 @@
 from django.db import models
-from authentication.models import CustomUser
+from authentication.models import CustomUser, TokenClaimsMixin
 from base.models import BaseModel
 from main_admin.models import InventoryManager, Organization
 from supplier.models import Inventory
 
 # Create your models here.
 
-class Nurse(BaseModel):
+class Nurse(TokenClaimsMixin, BaseModel):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     inventory_manager = models.ForeignKey(InventoryManager, on_delete=models.CASCADE)
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
 
+    claim_fields = ('organization_id',)
+
     def __str__(self):
         return f" {self.organization.name} {self.user.first_name} {self.user.last_name}"
 
@@ -19,6 +21,13 @@ class OrgInventory(BaseModel):
     inventory = models.ForeignKey(Inventory, on_delete=models.CASCADE)
     quantity_in_stock = models.IntegerField()
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
+    # Stock routine requests must leave in place so it stays available for emergencies.
+    emergency_reserve = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["inventory", "organization"], name="unique_org_inventory"),
+        ]
 
     def __str__(self):
         return f"Inventory Name : {self.inventory.name}"
\ No newline at end of file
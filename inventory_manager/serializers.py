@@ -73,13 +73,20 @@ class NurseDetailsSerializer(serializers.ModelSerializer):
 class OrgInventorySerializer(serializers.ModelSerializer):
     class Meta:
         model = OrgInventory
-        fields = ['id','quantity_in_stock','inventory','organization','created_by','updated_by']
+        fields = ['id','quantity_in_stock','emergency_reserve','inventory','organization','created_by','updated_by']
         extra_kwargs = {'id': {'read_only': True},
                         'organization': {'read_only': True},
                         'created_by': {'read_only': True},
                         'updated_by': {'read_only': True}}
 
 
+class EmergencyReserveSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrgInventory
+        fields = ['id','quantity_in_stock','emergency_reserve']
+        read_only_fields = ['id','quantity_in_stock']
+
+
 class AvailableSupplierSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
@@ -1,7 +1,8 @@
 from django.shortcuts import get_object_or_404
 from rest_framework import permissions, status
+from authentication.tokens import user_claims
 from base.constants import DETAILS_FETCHED
-from base.pagination import MyLimitOffsetPagination
+from base.pagination import MyCursorPagination, MyLimitOffsetPagination
 from base.role_access import RoleBasedPermission
 from base.utils import CustomUser
 from inventory_manager.constants import (AVAILABLE_NURSES, NURSE_UPDATED, NURSE_UPDATE_FAILED, NURSE_DELETED,
@@ -9,8 +10,7 @@ from inventory_manager.constants import (AVAILABLE_NURSES, NURSE_UPDATED, NURSE_
 from inventory_manager.models import Nurse, OrgInventory
 from rest_framework import generics
 from inventory_manager.serializers import NurseSerializer, NurseDetailsSerializer, OrgInventorySerializer, \
-    AvailableSupplierSerializer,SupplierInventorySerializer
-from main_admin.models import InventoryManager
+    AvailableSupplierSerializer,SupplierInventorySerializer, EmergencyReserveSerializer
 from main_admin.utils import success_response, error_response, delete_response
 from order_management.models import Order
 from order_management.serializers import OrderSerializer
@@ -26,9 +26,8 @@ class NurseView(generics.ListCreateAPIView):
     pagination_class = MyLimitOffsetPagination
 
     def get_queryset(self):
-        user = self.request.user
-        inventory_manager = InventoryManager.objects.filter(user=user).first()
-        return Nurse.objects.filter(organization=inventory_manager.organization) if inventory_manager else Nurse.objects.none()
+        organization_id = user_claims(self.request.user)['organization_id']
+        return Nurse.objects.filter(organization_id=organization_id) if organization_id else Nurse.objects.none()
 
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
@@ -70,12 +69,10 @@ class OrgInventoryView(generics.ListAPIView):
     pagination_message = AVAILABLE_INVENTORY
 
     def get_queryset(self):
-        user = self.request.user
-        try:
-            inventory_manager = InventoryManager.objects.get(user=user)
-            return OrgInventory.objects.filter(organization=inventory_manager.organization)
-        except InventoryManager.DoesNotExist:
+        organization_id = user_claims(self.request.user)['organization_id']
+        if organization_id is None:
             return OrgInventory.objects.none()
+        return OrgInventory.objects.filter(organization_id=organization_id)
 
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
@@ -85,6 +82,18 @@ class OrgInventoryView(generics.ListAPIView):
             return self.get_paginated_response(serializer.data)
         return success_response(serializer.data, status.HTTP_200_OK)
 
+class EmergencyReserveView(generics.UpdateAPIView):
+    serializer_class = EmergencyReserveSerializer
+    permission_classes = [permissions.IsAuthenticated, RoleBasedPermission]
+    allowed_roles = ['Inventory Manager']
+    http_method_names = ['patch']
+
+    def get_queryset(self):
+        return OrgInventory.objects.filter(organization_id=user_claims(self.request.user)['organization_id'])
+
+    def perform_update(self, serializer):
+        serializer.save(updated_by=self.request.user)
+
 class AvailableSupplierView(generics.ListAPIView):
     serializer_class = AvailableSupplierSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, RoleBasedPermission]
@@ -110,13 +119,11 @@ class IMOrderListView(generics.ListAPIView):
     serializer_class = OrderSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly, RoleBasedPermission)
     allowed_roles = ['Inventory Manager']
-    pagination_class = MyLimitOffsetPagination
+    pagination_class = MyCursorPagination
     pagination_message = YOUR_ORDERS
 
     def get_queryset(self):
-        user = self.request.user
-        try:
-            inventory_manager = InventoryManager.objects.get(user=user)
-        except InventoryManager.DoesNotExist:
+        inventory_manager_id = user_claims(self.request.user)['inventory_manager_id']
+        if inventory_manager_id is None:
             return Order.objects.none()
-        return Order.objects.filter(inventory_manager=inventory_manager).order_by("-created")
\ No newline at end of file
+        return Order.objects.for_listing().filter(inventory_manager_id=inventory_manager_id).order_by("-created")
\ No newline at end of file
@@ -1,6 +1,6 @@
 from django.db import models
 
-from authentication.models import CustomUser
+from authentication.models import CustomUser, TokenClaimsMixin
 from base.models import BaseModel
 
 
@@ -21,9 +21,11 @@ class Organization(BaseModel):
         return self.name
 
 
-class InventoryManager(BaseModel):
+class InventoryManager(TokenClaimsMixin,BaseModel):
     user = models.ForeignKey(CustomUser,on_delete=models.CASCADE)
     organization = models.ForeignKey(Organization,on_delete=models.CASCADE)
 
+    claim_fields = ('organization_id',)
+
     def __str__(self):
         return f"Org is : {self.organization.name} And IM is : {self.user.first_name}"
\ No newline at end of file
@@ -1,3 +1,45 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from authentication.models import CustomUser
+from base.testing import MediaRootTestMixin
+
+
+class EstimatedCountTests(MediaRootTestMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create(email="admin@example.com", first_name="Main", last_name="Admin",
+                                              phone_number="1000", role="Admin")
+        for i in range(5):
+            CustomUser.objects.create(email=f"user{i}@example.com", first_name="User", last_name=str(i),
+                                      phone_number=f"2{i:03}", role="Nurse")
+
+    def list_users(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get(reverse("user-list"), {"limit": 2, "offset": 0})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    @override_settings(PAGINATION_ESTIMATED_COUNT_THRESHOLD=100)
+    def test_small_table_is_counted_exactly(self):
+        data = self.list_users()
+
+        self.assertEqual(data["count"], 6)
+        self.assertFalse(data["count_estimated"])
+
+    @override_settings(PAGINATION_ESTIMATED_COUNT_THRESHOLD=3)
+    def test_large_table_uses_estimate(self):
+        if connection.vendor == "postgresql":
+            # reltuples stays unset until the table is analyzed; ANALYZE sees this transaction's rows.
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(CustomUser._meta.db_table)}")
+
+        data = self.list_users()
+
+        self.assertTrue(data["count_estimated"])
+        self.assertGreaterEqual(data["count"], 6)
+        self.assertEqual(len(data["data"]), 2)
@@ -25,6 +25,7 @@ class UserListViewAPI(generics.ListAPIView):
     allowed_roles = [FIELD_ADMIN]
     pagination_class = MyLimitOffsetPagination
     pagination_message = AVAILABLE_USERS
+    estimate_count = True
 
 class UserDetailViewAPI(generics.RetrieveUpdateDestroyAPIView):
     queryset = CustomUser.objects.all()
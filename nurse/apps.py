@@ -4,6 +4,3 @@ from django.apps import AppConfig
 class NurseConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "nurse"
-
-    def ready(self):
-        import nurse.signals
\ No newline at end of file
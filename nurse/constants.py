@@ -13,6 +13,12 @@ RETURNABLE_ITEMS_FETCHED = "Returnable items fetched successfully."
 ITEM_RETURNED_SUCCESSFULLY = "Item returned successfully."
 ITEM_RETURN_FAILED = "Failed to return item."
 ALL_FIELDS_REQUIRED = "All fields: request, inventory, and quantity_returned are required."
-ITEM_NOT_RETURNED = "inventory: Item not found, not reusable, or already returned."
-CANNOT_RETURN_MORE_THAN_PENDING ="quantity_returned: Cannot return more than pending quantity. Pending: {pending}"
-RETURN_STATUS_FETCHED = "Return status fetched successfully."
\ No newline at end of file
+RETURN_STATUS_FETCHED = "Return status fetched successfully."
+INSUFFICIENT_STOCK = "Insufficient stock for {items}."
+INVENTORY_NOT_FOUND = "Inventory not found in your organization: {items}."
+INSUFFICIENT_STOCK_OUTCOME = "Insufficient stock."
+OUTSTANDING_RETURNS_FETCHED = "Outstanding returns fetched successfully."
+ITEM_NOT_RETURNABLE = "Item not found in request, not reusable, or already returned."
+RETURN_EXCEEDS_PENDING = "Cannot return more than pending. Pending: {pending}"
+PENDING_QUEUE_FETCHED = "Pending requests fetched in processing order."
+TOP_CONSUMERS_FETCHED = "Top consumers fetched successfully."
@@ -0,0 +1,78 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+from inventory_manager.models import Nurse
+from nurse.models import ConsumptionRollup, RequestedItems
+
+
+class Command(BaseCommand):
+    help = ("Rebuilds the consumption rollup from approved requests, one chunk of nurses at a time. Items are booked "
+            "on the day their request was approved, returns included, as the approval and return flows do. "
+            "Every rollup row of a chunk is overwritten with the totals computed from its requests, so the command "
+            "can be re-run safely while approvals and returns keep being recorded; a row first created by one of "
+            "them while its chunk is processed is corrected by the next run.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=100, help="Number of nurses processed per chunk.")
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        last_pk, processed, written, removed = None, 0, 0, 0
+        while True:
+            nurses = Nurse.objects.order_by("pk")
+            if last_pk is not None:
+                nurses = nurses.filter(pk__gt=last_pk)
+            nurse_ids = list(nurses.values_list("pk", flat=True)[:chunk_size])
+            if not nurse_ids:
+                break
+
+            with transaction.atomic():
+                # Locking the existing rows first makes concurrent approvals and returns wait, so their
+                # increments land on top of the totals written here instead of being overwritten.
+                existing = {
+                    (nurse_id, org_inventory_id, day): pk
+                    for pk, nurse_id, org_inventory_id, day in ConsumptionRollup.objects.select_for_update()
+                    .filter(nurse_id__in=nurse_ids)
+                    .order_by("pk")
+                    .values_list("pk", "nurse_id", "org_inventory_id", "day")
+                }
+
+                totals = defaultdict(lambda: {"consumed": 0, "returned": 0})
+                for row in (
+                    RequestedItems.objects.filter(request__status="Approved", request__nurse_id__in=nurse_ids)
+                    .values("request__nurse_id", "inventory_id", "request__organization_id",
+                            day=TruncDate(Coalesce("request__approved_at", "request__created")))
+                    .annotate(consumed=Sum("quantity_requested"), returned=Sum("quantity_returned"))
+                    .order_by()
+                ):
+                    total = totals[(row["request__nurse_id"], row["inventory_id"], row["day"])]
+                    total["organization_id"] = row["request__organization_id"]
+                    total["consumed"] += row["consumed"]
+                    total["returned"] += row["returned"]
+
+                ConsumptionRollup.objects.bulk_create(
+                    [
+                        ConsumptionRollup(nurse_id=nurse_id, org_inventory_id=org_inventory_id, day=day, **total)
+                        for (nurse_id, org_inventory_id, day), total in totals.items()
+                    ],
+                    update_conflicts=True,
+                    unique_fields=["nurse", "org_inventory", "day"],
+                    update_fields=["organization", "consumed", "returned", "updated"],
+                )
+                deleted, _ = ConsumptionRollup.objects.filter(
+                    pk__in=[pk for key, pk in existing.items() if key not in totals]
+                ).delete()
+
+            last_pk = nurse_ids[-1]
+            processed += len(nurse_ids)
+            written += len(totals)
+            removed += deleted
+            self.stdout.write(f"Processed {processed} nurse(s).")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt consumption rollup for {processed} nurse(s): {written} row(s) written, {removed} removed."
+        ))
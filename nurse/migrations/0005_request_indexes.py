@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory_manager", "0004_orginventory_unique_org_inventory"),
+        ("main_admin", "0004_alter_inventorymanager_user"),
+        ("nurse", "0004_requesteditems_quantity_returned"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["organization", "status", "created"],
+                name="request_org_status_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["nurse", "created"], name="request_nurse_created_idx"
+            ),
+        ),
+    ]
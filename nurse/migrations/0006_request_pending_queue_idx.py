@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory_manager", "0005_orginventory_emergency_reserve"),
+        ("main_admin", "0004_alter_inventorymanager_user"),
+        ("nurse", "0005_request_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                condition=models.Q(("status", "Pending")),
+                fields=["organization", "-is_emergency", "created"],
+                name="request_pending_queue_idx",
+            ),
+        ),
+    ]
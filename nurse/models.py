@@ -20,17 +20,19 @@ class Request(BaseModel):
     rejected_at = models.DateTimeField(null=True, blank=True)
     status= models.CharField(max_length=10, choices=STATUS_CHOICES, default="Pending")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["organization", "status", "created"], name="request_org_status_created_idx"),
+            models.Index(fields=["nurse", "created"], name="request_nurse_created_idx"),
+            models.Index(fields=["organization", "-is_emergency", "created"], name="request_pending_queue_idx",
+                          condition=models.Q(status="Pending")),
+        ]
 
     def save(self, *args, **kwargs):
         if self.approved_by and self.rejected_by:
             raise ValueError("Request can't be both approved and rejected.")
         super().save(*args, **kwargs)
 
-    def update_total(self):
-        total = self.requested_items.values('inventory').distinct().count()
-        self.total_items = total
-        self.save()
-
     def __str__(self):
         return f"{self.nurse.user.first_name} - {self.status}"
 
@@ -42,4 +44,23 @@ class RequestedItems(BaseModel):
     is_returned = models.BooleanField(default=False)
 
     def __str__(self):
-        return f"{self.inventory.inventory.name} - {self.quantity_requested}"
\ No newline at end of file
+        return f"{self.inventory.inventory.name} - {self.quantity_requested}"
+
+class ConsumptionRollup(BaseModel):
+    nurse = models.ForeignKey(Nurse, on_delete=models.CASCADE, related_name="consumption")
+    org_inventory = models.ForeignKey(OrgInventory, on_delete=models.CASCADE)
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
+    day = models.DateField()
+    consumed = models.PositiveIntegerField(default=0)
+    returned = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["nurse", "org_inventory", "day"], name="unique_consumption_rollup"),
+        ]
+        indexes = [
+            models.Index(fields=["organization", "org_inventory", "day"], name="consumption_org_item_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.nurse_id} - {self.org_inventory_id} - {self.day}"
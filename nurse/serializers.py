@@ -1,15 +1,16 @@
 from rest_framework import serializers
-from django.utils import timezone
-from rest_framework.exceptions import ValidationError
 from inventory_manager.models import Nurse
 from nurse.models import Request , RequestedItems
+from nurse.utils import return_items, submit_request
 
 class RequestedItemSerializer(serializers.ModelSerializer):
+    inventory = serializers.UUIDField(source='inventory_id')
 
     class Meta:
         model = RequestedItems
         fields = ['id','inventory','quantity_requested','is_returned']
-        extra_kwargs = {"id": {"read_only": True}}
+        extra_kwargs = {"id": {"read_only": True},
+                        "quantity_requested": {"min_value": 1}}
 
 class RequestSerializer(serializers.ModelSerializer):
     requested_items = RequestedItemSerializer(many=True)
@@ -21,40 +22,13 @@ class RequestSerializer(serializers.ModelSerializer):
 
 
     def create(self, validated_data):
-        items_data = validated_data.pop("requested_items")
-        nurse = Nurse.objects.get(user=self.context['request'].user)
-        organization = nurse.organization
-        is_emergency = validated_data.get('is_emergency', False)
+        user = self.context['request'].user
+        nurse = Nurse.objects.get(user=user)
+        return submit_request(nurse, validated_data["requested_items"], validated_data.get('is_emergency', False), user)
 
-        request_obj = Request.objects.create(
-            nurse=nurse,
-            organization=organization,
-            is_emergency=is_emergency,
-            created_by=self.context['request'].user,
-            updated_by=self.context['request'].user,
-            status='Approved' if is_emergency else 'Pending',
-            approved_by=self.context['request'].user if is_emergency else None,
-            approved_at=timezone.now() if is_emergency else None
-        )
-
-        for item in items_data:
-            org_inventory = item['inventory']
-            if org_inventory.quantity_in_stock < item['quantity_requested']:
-                raise ValidationError(
-                    {
-                        "Details": f"Insufficient stock for {org_inventory.inventory.name}. Requested: {item['quantity_requested']}, Available: {org_inventory.quantity_in_stock}"
-                    }
-                )
-
-            RequestedItems.objects.create(
-                request=request_obj,
-                created_by=self.context['request'].user,
-                updated_by=self.context['request'].user,
-                **item
-            )
-
-        request_obj.update_total()
-        return request_obj
+class RequestBulkActionSerializer(serializers.Serializer):
+    requests = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=500)
+    action = serializers.ChoiceField(choices=['Approved','Rejected'])
 
 class ReturnableItemSerializer(serializers.ModelSerializer):
     class Meta:
@@ -66,6 +40,7 @@ class ReturnInventorySerializer(serializers.ModelSerializer):
         model = RequestedItems
         fields = ['id', 'request', 'inventory', 'is_returned','quantity_requested','quantity_returned']
         read_only_fields = ['id', 'is_returned','quantity_requested']
+        extra_kwargs = {"quantity_returned": {"min_value": 1}}
 
     def validate(self, data):
         request_obj = data.get('request')
@@ -79,32 +54,30 @@ class ReturnInventorySerializer(serializers.ModelSerializer):
         if not return_qty:
             raise serializers.ValidationError({"quantity_returned": "This field is required."})
 
-        try:
-            item = RequestedItems.objects.get(
-                request=request_obj,
-                inventory=inventory_obj,
-                inventory__inventory__is_reusable=True,
-            )
-        except RequestedItems.DoesNotExist:
-            raise serializers.ValidationError({
-                "inventory": "Item not found in request, not reusable, or already returned."
-            })
-
-        pending = item.quantity_requested - item.quantity_returned
-        if return_qty>pending:
-            raise serializers.ValidationError({
-                "quantity_returned": f"Cannot return more than pending. Pending: {pending}"
-            })
-
-        data['requested_item'] = item
         return data
 
     def create(self, validated_data):
-        item = validated_data['requested_item']
-        return_qty = validated_data.get('quantity_returned')
-        item.quantity_returned += return_qty
-        if item.quantity_returned == item.quantity_requested:
-            item.is_returned = True
-        item.updated_by = self.context['request'].user
-        item.save()
-        return item
+        key = (validated_data['request'].pk, validated_data['inventory'].pk)
+        errors = return_items({key: validated_data['quantity_returned']}, self.context['request'].user)
+        if errors:
+            raise serializers.ValidationError(errors[key])
+        return RequestedItems.objects.get(request_id=key[0], inventory_id=key[1])
+
+class ReturnLineSerializer(serializers.Serializer):
+    request = serializers.UUIDField()
+    inventory = serializers.UUIDField()
+    quantity_returned = serializers.IntegerField(min_value=1)
+
+class OutstandingReturnSerializer(serializers.Serializer):
+    request_id = serializers.UUIDField()
+    total_requested = serializers.IntegerField()
+    total_returned = serializers.IntegerField()
+    total_pending = serializers.IntegerField()
+
+class ConsumerSerializer(serializers.Serializer):
+    nurse_id = serializers.UUIDField()
+    first_name = serializers.CharField()
+    last_name = serializers.CharField()
+    total_consumed = serializers.IntegerField()
+    total_returned = serializers.IntegerField()
+    net_consumed = serializers.IntegerField()
@@ -1,3 +1,495 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from authentication.models import CustomUser
+from base.testing import MediaRootTestMixin
+from inventory_manager.models import Nurse, OrgInventory
+from main_admin.models import InventoryCategory, InventoryManager, Organization
+from nurse.models import ConsumptionRollup, Request, RequestedItems
+from nurse.utils import approve_request, return_items
+from supplier.models import Inventory
+
+
+class RequestFixturesMixin(MediaRootTestMixin):
+
+    def create_fixtures(self, items=("Gloves", "Syringes")):
+        self.im_user = CustomUser.objects.create(email="im@example.com", first_name="Inv", last_name="Manager",
+                                                 phone_number="1000", role="Inventory Manager")
+        self.nurse_user = CustomUser.objects.create(email="nurse@example.com", first_name="Ward", last_name="Nurse",
+                                                    phone_number="3000", role="Nurse")
+        self.supplier = CustomUser.objects.create(email="supplier@example.com", first_name="Supplier",
+                                                  last_name="One", phone_number="2000", role="Supplier")
+        organization = Organization.objects.create(name="City Hospital", email="city@example.com",
+                                                   address="Main Street")
+        inventory_manager = InventoryManager.objects.create(user=self.im_user, organization=organization)
+        self.nurse = Nurse.objects.create(user=self.nurse_user, inventory_manager=inventory_manager,
+                                          organization=organization)
+        self.category = InventoryCategory.objects.create(name="Consumables")
+        inventories = Inventory.objects.bulk_create([
+            Inventory(name=name, supplier=self.supplier, category=self.category) for name in items
+        ])
+        self.stock = OrgInventory.objects.bulk_create([
+            OrgInventory(inventory=inventory, organization=organization, quantity_in_stock=10)
+            for inventory in inventories
+        ])
+
+    def create_request(self, items):
+        request_obj = Request.objects.create(nurse=self.nurse, organization=self.nurse.organization)
+        RequestedItems.objects.bulk_create([
+            RequestedItems(request=request_obj, inventory=org_inventory, quantity_requested=quantity)
+            for org_inventory, quantity in items
+        ])
+        return request_obj
+
+
+class ConcurrentApprovalTests(RequestFixturesMixin, TransactionTestCase):
+
+    def setUp(self):
+        # Checked here rather than with skipUnless: the test database name is only set up by now.
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("The approval threads cannot share SQLite's in-memory test database.")
+        self.create_fixtures()
+
+    def test_concurrent_approvals_never_oversell(self):
+        gloves, syringes = self.stock
+        # Half of the requests list the items in the opposite order to exercise lock ordering.
+        requests = [
+            self.create_request([(gloves, 3), (syringes, 2)] if i % 2 else [(syringes, 2), (gloves, 3)])
+            for i in range(12)
+        ]
+        barrier = threading.Barrier(len(requests))
+        outcomes = []
+
+        def approve(request_obj):
+            try:
+                barrier.wait()
+                approve_request(request_obj, self.im_user)
+                outcomes.append("Approved")
+            except ValidationError:
+                outcomes.append("Insufficient")
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=approve, args=(request_obj,)) for request_obj in requests]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        gloves.refresh_from_db()
+        syringes.refresh_from_db()
+        approved = outcomes.count("Approved")
+        self.assertEqual(len(outcomes), len(requests))
+        self.assertEqual(approved, 3)
+        self.assertEqual(gloves.quantity_in_stock, 10 - 3 * approved)
+        self.assertEqual(syringes.quantity_in_stock, 10 - 2 * approved)
+        self.assertEqual(Request.objects.filter(status="Approved").count(), approved)
+
+    def test_approving_twice_takes_stock_once(self):
+        gloves, _ = self.stock
+        request_obj = self.create_request([(gloves, 4)])
+
+        approve_request(request_obj, self.im_user)
+        with self.assertRaises(ValidationError):
+            approve_request(request_obj, self.im_user)
+        request_obj.refresh_from_db()
+        request_obj.save()
+
+        gloves.refresh_from_db()
+        self.assertEqual(gloves.quantity_in_stock, 6)
+
+
+class RequestSubmissionTests(RequestFixturesMixin, TestCase):
+
+    def setUp(self):
+        self.create_fixtures(items=[f"Item {i}" for i in range(50)])
+
+    def submit(self, items, is_emergency=False):
+        client = APIClient()
+        client.force_authenticate(self.nurse_user)
+        payload = {
+            "is_emergency": is_emergency,
+            "requested_items": [
+                {"inventory": str(org_inventory.pk), "quantity_requested": quantity} for org_inventory, quantity in items
+            ],
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(reverse("request-create"), payload, format="json")
+        return response, len(queries)
+
+    def test_emergency_request_takes_stock_and_counts_items(self):
+        gloves, syringes = self.stock[:2]
+
+        response, _ = self.submit([(gloves, 3), (syringes, 2), (gloves, 1)], is_emergency=True)
+
+        self.assertEqual(response.status_code, 201)
+        request_obj = Request.objects.get()
+        self.assertEqual((request_obj.status, request_obj.total_items), ("Approved", 2))
+        gloves.refresh_from_db()
+        syringes.refresh_from_db()
+        self.assertEqual((gloves.quantity_in_stock, syringes.quantity_in_stock), (6, 8))
+
+    def test_short_stock_rejects_the_whole_request(self):
+        gloves, syringes = self.stock[:2]
+
+        response, _ = self.submit([(gloves, 3), (syringes, 11)])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Request.objects.exists())
+        gloves.refresh_from_db()
+        self.assertEqual(gloves.quantity_in_stock, 10)
+
+    def test_short_stock_leaves_an_emergency_request_pending(self):
+        gloves, syringes = self.stock[:2]
+
+        response, _ = self.submit([(gloves, 3), (syringes, 11)], is_emergency=True)
+
+        self.assertEqual(response.status_code, 201)
+        request_obj = Request.objects.get()
+        self.assertEqual((request_obj.status, request_obj.approved_by), ("Pending", None))
+        gloves.refresh_from_db()
+        self.assertEqual(gloves.quantity_in_stock, 10)
+
+    def test_submission_query_count_is_constant(self):
+        _, small_request_queries = self.submit([(self.stock[0], 1)], is_emergency=True)
+        _, large_request_queries = self.submit([(org_inventory, 1) for org_inventory in self.stock],
+                                               is_emergency=True)
+
+        self.assertEqual(small_request_queries, large_request_queries)
+
+
+class BulkRequestActionTests(RequestFixturesMixin, TestCase):
+
+    def setUp(self):
+        self.create_fixtures()
+
+    def act(self, requests, action):
+        client = APIClient()
+        client.force_authenticate(self.im_user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(reverse("request-action-bulk"),
+                                   {"requests": [str(request_obj.pk) for request_obj in requests], "action": action},
+                                   format="json")
+        self.assertEqual(response.status_code, 200)
+        return {result["id"]: result["outcome"] for result in response.data["results"]}, len(queries)
+
+    def test_bulk_approval_allocates_stock_in_submission_order(self):
+        gloves, syringes = self.stock
+        requests = [self.create_request([(gloves, 4), (syringes, 1)]) for _ in range(3)]
+        processed = self.create_request([(syringes, 1)])
+        Request.objects.filter(pk=processed.pk).update(status="Rejected")
+
+        outcomes, _ = self.act(requests + [processed], "Approved")
+
+        self.assertEqual([outcomes[request_obj.pk] for request_obj in requests + [processed]],
+                         ["Approved", "Approved", "Insufficient stock.", "Request already processed."])
+        gloves.refresh_from_db()
+        syringes.refresh_from_db()
+        self.assertEqual((gloves.quantity_in_stock, syringes.quantity_in_stock), (2, 8))
+        self.assertEqual(Request.objects.get(pk=requests[2].pk).status, "Pending")
+
+    def test_bulk_rejection(self):
+        requests = [self.create_request([(self.stock[0], 20)]) for _ in range(2)]
+
+        outcomes, _ = self.act(requests, "Rejected")
+
+        self.assertEqual(set(outcomes.values()), {"Rejected"})
+        self.assertEqual(Request.objects.filter(status="Rejected", rejected_by=self.im_user).count(), 2)
+
+    def test_bulk_approval_query_count_is_constant(self):
+        gloves, syringes = self.stock
+        OrgInventory.objects.filter(pk__in=[gloves.pk, syringes.pk]).update(quantity_in_stock=1000)
+
+        _, small_batch_queries = self.act([self.create_request([(gloves, 1), (syringes, 1)])], "Approved")
+        _, large_batch_queries = self.act(
+            [self.create_request([(gloves, 1), (syringes, 1)]) for _ in range(50)], "Approved"
+        )
+
+        self.assertEqual(small_batch_queries, large_batch_queries)
+
+
+class ReturnBalanceTests(RequestFixturesMixin, TestCase):
+
+    def setUp(self):
+        self.create_fixtures()
+        Inventory.objects.update(is_reusable=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.im_user)
+
+    def test_return_status_and_outstanding_balances(self):
+        gloves, syringes = self.stock
+        open_request = self.create_request([(gloves, 4), (syringes, 2)])
+        settled_request = self.create_request([(gloves, 1)])
+        Request.objects.update(status="Approved")
+        RequestedItems.objects.filter(request=open_request, inventory=gloves).update(quantity_returned=3)
+        RequestedItems.objects.filter(request=settled_request).update(quantity_returned=1, is_returned=True)
+
+        response = self.client.get(reverse("request-return-status", args=[open_request.pk]))
+        self.assertEqual(response.data, {"total_requested": 6, "total_returned": 3, "total_pending": 3})
+
+        response = self.client.get(reverse("request-return-outstanding"))
+        self.assertEqual(response.data["count"], 1)
+        self.assertEqual(response.data["data"][0]["request_id"], str(open_request.pk))
+        self.assertEqual(response.data["data"][0]["total_pending"], 3)
+
+    def return_items(self, lines):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("request-return-bulk"), {"items": [
+                {"request": str(request_obj.pk), "inventory": str(org_inventory.pk), "quantity_returned": quantity}
+                for request_obj, org_inventory, quantity in lines
+            ]}, format="json")
+        return response, len(queries)
+
+    def test_bulk_return_credits_only_the_returned_delta(self):
+        gloves, syringes = self.stock
+        request_obj = self.create_request([(gloves, 4), (syringes, 2)])
+        Request.objects.update(status="Approved")
+
+        response, _ = self.return_items([(request_obj, gloves, 1), (request_obj, gloves, 2), (request_obj, syringes, 3)])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["returned"], 1)
+        self.assertIn("quantity_returned", response.data["errors"][0]["Error"])
+        item = RequestedItems.objects.get(request=request_obj, inventory=gloves)
+        self.assertEqual((item.quantity_returned, item.is_returned), (3, False))
+
+        self.client.post(reverse("request-return"), {"request": request_obj.pk, "inventory": gloves.pk,
+                                                     "quantity_returned": 1})
+        item.refresh_from_db()
+        item.save()
+        item.save()
+
+        gloves.refresh_from_db()
+        self.assertTrue(item.is_returned)
+        self.assertEqual(gloves.quantity_in_stock, 14)
+
+    def test_bulk_return_query_count_is_constant(self):
+        request_obj = self.create_request([(org_inventory, 5) for org_inventory in self.stock])
+        Request.objects.update(status="Approved")
+
+        _, single_line_queries = self.return_items([(request_obj, self.stock[0], 1)])
+        _, many_line_queries = self.return_items([(request_obj, org_inventory, 1) for org_inventory in self.stock])
+
+        self.assertEqual(single_line_queries, many_line_queries)
+
+
+class RequestListScopeTests(RequestFixturesMixin, TestCase):
+
+    def setUp(self):
+        self.create_fixtures()
+        other_user = CustomUser.objects.create(email="other@example.com", first_name="Other", last_name="Nurse",
+                                               phone_number="3001", role="Nurse")
+        self.other_nurse = Nurse.objects.create(user=other_user, inventory_manager=self.nurse.inventory_manager,
+                                                organization=self.nurse.organization)
+        other_organization = Organization.objects.create(name="County Clinic", email="county@example.com",
+                                                         address="Side Street")
+        foreign_user = CustomUser.objects.create(email="foreign@example.com", first_name="Foreign",
+                                                 last_name="Nurse", phone_number="3002", role="Nurse")
+        foreign_nurse = Nurse.objects.create(user=foreign_user, inventory_manager=self.nurse.inventory_manager,
+                                             organization=other_organization)
+        self.own = Request.objects.create(nurse=self.nurse, organization=self.nurse.organization)
+        self.colleague = Request.objects.create(nurse=self.other_nurse, organization=self.nurse.organization,
+                                                is_emergency=True, status="Approved")
+        Request.objects.create(nurse=foreign_nurse, organization=other_organization)
+
+    def list_requests(self, user, **params):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get(reverse("request-list"), params)
+        self.assertEqual(response.status_code, 200)
+        return {request_obj["id"] for request_obj in response.data["data"]}
+
+    def test_listing_is_scoped_and_filtered(self):
+        own, colleague = str(self.own.pk), str(self.colleague.pk)
+
+        self.assertEqual(self.list_requests(self.nurse_user), {own})
+        self.assertEqual(self.list_requests(self.im_user), {own, colleague})
+        self.assertEqual(self.list_requests(self.im_user, status="Approved"), {colleague})
+        self.assertEqual(self.list_requests(self.im_user, is_emergency="false"), {own})
+        self.assertEqual(self.list_requests(self.im_user, created_after="2000-01-01",
+                                            created_before="2000-12-31"), set())
+
+
+class EmergencyPriorityTests(RequestFixturesMixin, TestCase):
+
+    def setUp(self):
+        self.create_fixtures()
+        self.gloves = self.stock[0]
+        OrgInventory.objects.filter(pk=self.gloves.pk).update(emergency_reserve=4)
+        self.client = APIClient()
+        self.client.force_authenticate(self.im_user)
+
+    def test_routine_approval_leaves_the_emergency_reserve(self):
+        routine = self.create_request([(self.gloves, 7)])
+
+        with self.assertRaises(ValidationError):
+            approve_request(routine, self.im_user)
+        approve_request(self.create_request([(self.gloves, 6)]), self.im_user)
+
+        self.gloves.refresh_from_db()
+        self.assertEqual(self.gloves.quantity_in_stock, 4)
+
+    def test_routine_submission_and_update_leave_the_emergency_reserve(self):
+        self.client.force_authenticate(self.nurse_user)
+        response = self.client.post(reverse("request-create"), {
+            "requested_items": [{"inventory": str(self.gloves.pk), "quantity_requested": 7}],
+        }, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        routine = self.create_request([(self.gloves, 6)])
+        response = self.client.patch(reverse("request-detail", args=[routine.pk]), {"requested_items": [
+            {"id": str(routine.requested_items.get().pk), "quantity_requested": 7},
+        ]}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(routine.requested_items.get().quantity_requested, 6)
+
+    def test_emergency_submission_may_use_the_reserve(self):
+        self.client.force_authenticate(self.nurse_user)
+        response = self.client.post(reverse("request-create"), {
+            "is_emergency": True,
+            "requested_items": [{"inventory": str(self.gloves.pk), "quantity_requested": 10}],
+        }, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.gloves.refresh_from_db()
+        self.assertEqual(self.gloves.quantity_in_stock, 0)
+
+    def test_queue_and_bulk_approval_serve_emergencies_first(self):
+        routine = self.create_request([(self.gloves, 5)])
+        nurse_client = APIClient()
+        nurse_client.force_authenticate(self.nurse_user)
+        response = nurse_client.post(reverse("request-create"), {
+            "is_emergency": True,
+            "requested_items": [{"inventory": str(self.gloves.pk), "quantity_requested": 11}],
+        }, format="json")
+        emergency = Request.objects.get(is_emergency=True)
+        self.assertEqual((response.status_code, emergency.status), (201, "Pending"))
+
+        response = self.client.get(reverse("request-queue"), {"limit": 1})
+        self.assertEqual([request_obj["id"] for request_obj in response.data["data"]], [str(emergency.pk)])
+
+        OrgInventory.objects.filter(pk=self.gloves.pk).update(quantity_in_stock=12)
+
+        response = self.client.post(reverse("request-action-bulk"),
+                                    {"requests": [str(routine.pk), str(emergency.pk)], "action": "Approved"},
+                                    format="json")
+        outcomes = {result["id"]: result["outcome"] for result in response.data["results"]}
+        self.assertEqual(outcomes, {emergency.pk: "Approved", routine.pk: "Insufficient stock."})
+
+
+class ConsumptionRollupTests(RequestFixturesMixin, TestCase):
+
+    def setUp(self):
+        self.create_fixtures()
+        Inventory.objects.update(is_reusable=True)
+        other_user = CustomUser.objects.create(email="other@example.com", first_name="Other", last_name="Nurse",
+                                               phone_number="3001", role="Nurse")
+        self.other_nurse = Nurse.objects.create(user=other_user, inventory_manager=self.nurse.inventory_manager,
+                                                organization=self.nurse.organization)
+        self.client = APIClient()
+        self.client.force_authenticate(self.im_user)
+
+    def rollup(self):
+        return sorted(ConsumptionRollup.objects.values_list("nurse_id", "org_inventory_id", "day", "consumed",
+                                                            "returned"))
+
+    def test_rollup_follows_approvals_and_returns(self):
+        gloves, syringes = self.stock
+        own = self.create_request([(gloves, 2), (syringes, 1)])
+        colleague = Request.objects.create(nurse=self.other_nurse, organization=self.nurse.organization)
+        RequestedItems.objects.create(request=colleague, inventory=gloves, quantity_requested=5)
+
+        approve_request(own, self.im_user)
+        self.client.post(reverse("request-action-bulk"), {"requests": [str(colleague.pk)], "action": "Approved"},
+                         format="json")
+        self.client.post(reverse("request-return-bulk"), {"items": [
+            {"request": str(colleague.pk), "inventory": str(gloves.pk), "quantity_returned": 4},
+        ]}, format="json")
+
+        response = self.client.get(reverse("request-consumption-top"), {"inventory": str(gloves.pk)})
+        self.assertEqual([(row["nurse_id"], row["net_consumed"]) for row in response.data["data"]],
+                         [(str(self.nurse.pk), 2), (str(self.other_nurse.pk), 1)])
+
+        live = self.rollup()
+        call_command("backfill_consumption", "--chunk-size", "1", stdout=StringIO())
+        self.assertEqual(self.rollup(), live)
+
+        ConsumptionRollup.objects.filter(nurse=self.nurse).update(consumed=99)
+        ConsumptionRollup.objects.create(nurse=self.other_nurse, org_inventory=syringes,
+                                         organization=self.nurse.organization, day="2020-01-01", consumed=7)
+        call_command("backfill_consumption", stdout=StringIO())
+        call_command("backfill_consumption", stdout=StringIO())
+        self.assertEqual(self.rollup(), live)
+
+    def test_backfill_reproduces_returns_booked_after_the_approval_day(self):
+        gloves, _ = self.stock
+        request_obj = self.create_request([(gloves, 5)])
+        approved_at = timezone.now() - timedelta(days=3)
+        with mock.patch("django.utils.timezone.now", return_value=approved_at):
+            approve_request(request_obj, self.im_user)
+        return_items({(request_obj.pk, gloves.pk): 2}, self.im_user)
+
+        live = self.rollup()
+        self.assertEqual(live, [(self.nurse.pk, gloves.pk, timezone.localdate(approved_at), 5, 2)])
+        response = self.client.get(reverse("request-consumption-top"), {
+            "inventory": str(gloves.pk), "start": str(timezone.localdate())})
+        self.assertEqual(response.data["data"], [])
+
+        call_command("backfill_consumption", stdout=StringIO())
+        self.assertEqual(self.rollup(), live)
+
+
+class RequestUpdateTests(RequestFixturesMixin, TestCase):
+
+    def setUp(self):
+        self.create_fixtures(items=[f"Item {i}" for i in range(50)])
+        self.client = APIClient()
+        self.client.force_authenticate(self.nurse_user)
+
+    def update_items(self, request_obj, quantities):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(reverse("request-detail", args=[request_obj.pk]), {"requested_items": [
+                {"id": str(item.pk), "quantity_requested": quantity} for item, quantity in quantities
+            ]}, format="json")
+        return response, len(queries)
+
+    def test_update_writes_new_quantities_with_constant_queries(self):
+        small = self.create_request([(self.stock[0], 1)])
+        large = self.create_request([(org_inventory, 1) for org_inventory in self.stock])
+
+        _, small_update_queries = self.update_items(small, [(item, 3) for item in small.requested_items.all()])
+        response, large_update_queries = self.update_items(large, [(item, 3) for item in large.requested_items.all()])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(small_update_queries, large_update_queries)
+        self.assertEqual(set(large.requested_items.values_list("quantity_requested", flat=True)), {3})
+
+    def test_update_rejects_quantities_above_stock(self):
+        request_obj = self.create_request([(self.stock[0], 1)])
+
+        response, _ = self.update_items(request_obj, [(request_obj.requested_items.get(), 11)])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(request_obj.requested_items.get().quantity_requested, 1)
+
+    def test_update_keeps_quantity_of_items_sent_without_one(self):
+        request_obj = self.create_request([(self.stock[0], 1), (self.stock[1], 2)])
+        first, second = request_obj.requested_items.order_by("quantity_requested")
+
+        response = self.client.patch(reverse("request-detail", args=[request_obj.pk]), {"requested_items": [
+            {"id": str(first.pk), "quantity_requested": 4}, {"id": str(second.pk)},
+        ]}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(request_obj.requested_items.values_list("quantity_requested", flat=True)), [2, 4])
@@ -0,0 +1,497 @@
+import uuid
+from collections import defaultdict
+from datetime import datetime, time
+
+from django.db import transaction
+from django.db.models import BooleanField, Case, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from base.utils import value_per_row
+from inventory_manager.models import OrgInventory
+from nurse.constants import (RETURN_EXCEEDS_PENDING, INSUFFICIENT_STOCK, INSUFFICIENT_STOCK_OUTCOME,
+                             INVENTORY_NOT_FOUND, ITEM_NOT_RETURNABLE, REQUEST_PROCESSED)
+from nurse.models import ConsumptionRollup, Request, RequestedItems
+
+
+def parse_created(param, value):
+    """
+    Parses a date or datetime query parameter used to filter on ``created``.
+
+    :param param: name of the query parameter, used in the error message
+    :param value: ISO 8601 date or datetime
+    :return: aware datetime
+    :raises ValidationError: if the value is not a valid date or datetime
+    """
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValidationError({param: "Enter a valid date or datetime."})
+        moment = datetime.combine(day, time.max if param == "created_before" else time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def requested_quantities(request_ids):
+    """
+    Sums the requested quantities per OrgInventory for the given requests.
+
+    :param request_ids: primary keys of the requests
+    :return: dict of OrgInventory primary key -> quantity
+    """
+    return dict(
+        RequestedItems.objects.filter(request_id__in=request_ids)
+        .values("inventory_id")
+        .annotate(quantity=Sum("quantity_requested"))
+        .order_by("inventory_id")
+        .values_list("inventory_id", "quantity")
+    )
+
+
+def lock_stock(org_inventory_ids):
+    """
+    Locks the OrgInventory rows with SELECT ... FOR UPDATE and returns their stock.
+
+    Rows are always locked in primary key order so two transactions touching the
+    same items wait for each other instead of deadlocking.
+
+    :param org_inventory_ids: primary keys of the OrgInventory rows
+    :return: dict of OrgInventory primary key -> (quantity in stock, emergency reserve)
+    """
+    return {
+        pk: (quantity_in_stock, emergency_reserve)
+        for pk, quantity_in_stock, emergency_reserve in OrgInventory.objects.select_for_update()
+        .filter(pk__in=org_inventory_ids)
+        .order_by("pk")
+        .values_list("pk", "quantity_in_stock", "emergency_reserve")
+    }
+
+
+def usable_stock(stock, emergency):
+    """
+    Returns how much of a locked stock row a request may take.
+
+    Routine requests have to leave the emergency reserve in place; emergency
+    requests may use all of the stock.
+
+    :param stock: (quantity in stock, emergency reserve) as returned by lock_stock
+    :param emergency: whether the stock is taken for an emergency request
+    """
+    quantity_in_stock, emergency_reserve = stock
+    return quantity_in_stock if emergency else quantity_in_stock - emergency_reserve
+
+
+def take_stock(quantities, user, emergency=False):
+    """
+    Decrements OrgInventory stock with one conditional UPDATE.
+
+    Every row is only matched while it still holds at least the quantity taken
+    from it, on top of its emergency reserve unless the stock is taken for an
+    emergency, so stock can never go negative even without a prior lock.
+
+    :param quantities: dict of OrgInventory primary key -> quantity to take
+    :param user: CustomUser recorded as the author of the change
+    :param emergency: whether the emergency reserve may be used
+    :raises ValidationError: if any of the rows does not have enough stock
+    """
+    if not quantities:
+        return
+
+    enough_stock = Q()
+    for pk, quantity in quantities.items():
+        floor = Value(quantity) if emergency else F("emergency_reserve") + quantity
+        enough_stock |= Q(pk=pk, quantity_in_stock__gte=floor)
+
+    updated = OrgInventory.objects.filter(enough_stock).update(
+        quantity_in_stock=F("quantity_in_stock") - value_per_row(quantities),
+        updated_by=user,
+        updated=timezone.now(),
+    )
+    if updated != len(quantities):
+        raise insufficient_stock(quantities)
+
+
+def reserve_stock(quantities, user, emergency=False):
+    """
+    Locks the affected OrgInventory rows and takes the requested quantities.
+
+    Must be called inside a transaction so the locks are held until it commits.
+
+    :param quantities: dict of OrgInventory primary key -> quantity to take
+    :param user: CustomUser recorded as the author of the change
+    :param emergency: whether the emergency reserve may be used
+    :raises ValidationError: if any of the rows does not have enough stock
+    """
+    stock = lock_stock(quantities)
+    short = [pk for pk, quantity in quantities.items()
+             if pk not in stock or usable_stock(stock[pk], emergency) < quantity]
+    if short:
+        raise insufficient_stock(short)
+    take_stock(quantities, user, emergency)
+
+
+def insufficient_stock(org_inventory_ids):
+    names = (
+        OrgInventory.objects.filter(pk__in=org_inventory_ids)
+        .order_by("inventory__name")
+        .values_list("inventory__name", flat=True)
+    )
+    return ValidationError({"Details": INSUFFICIENT_STOCK.format(items=", ".join(names))})
+
+
+def submit_request(nurse, items, is_emergency, user):
+    """
+    Creates a supply request with a fixed number of queries.
+
+    The referenced OrgInventory rows of the nurse's organization are locked and
+    read with one query, every line is validated in memory against them, the
+    items are written with one bulk insert and the request itself is written
+    once with its final total. Emergency requests are approved straight away
+    and take their stock in the same transaction; when stock is short they are
+    left pending instead, at the head of the inventory manager's queue.
+
+    :param nurse: Nurse submitting the request
+    :param items: list of dicts with ``inventory_id`` and ``quantity_requested``
+    :param is_emergency: whether the request is approved on creation
+    :param user: CustomUser submitting the request
+    :return: the created Request
+    :raises ValidationError: if an item is unknown or stock is short for a routine request
+    """
+    quantities = defaultdict(int)
+    for item in items:
+        quantities[item["inventory_id"]] += item["quantity_requested"]
+
+    with transaction.atomic():
+        stock = {
+            pk: ((quantity_in_stock, emergency_reserve), name)
+            for pk, quantity_in_stock, emergency_reserve, name in OrgInventory.objects.select_for_update(of=("self",))
+            .filter(pk__in=quantities, organization_id=nurse.organization_id)
+            .order_by("pk")
+            .values_list("pk", "quantity_in_stock", "emergency_reserve", "inventory__name")
+        }
+        missing = [str(pk) for pk in quantities if pk not in stock]
+        if missing:
+            raise ValidationError({"Details": INVENTORY_NOT_FOUND.format(items=", ".join(missing))})
+        short = sorted(stock[pk][1] for pk, quantity in quantities.items()
+                       if usable_stock(stock[pk][0], is_emergency) < quantity)
+        if short and not is_emergency:
+            raise ValidationError({"Details": INSUFFICIENT_STOCK.format(items=", ".join(short))})
+
+        approve = is_emergency and not short
+        now = timezone.now()
+        request_obj = Request(
+            nurse=nurse,
+            organization_id=nurse.organization_id,
+            is_emergency=is_emergency,
+            total_items=len(quantities),
+            status="Approved" if approve else "Pending",
+            approved_by=user if approve else None,
+            approved_at=now if approve else None,
+            created_by=user,
+            updated_by=user,
+        )
+        request_obj.save()
+        RequestedItems.objects.bulk_create([
+            RequestedItems(request=request_obj, inventory_id=pk, quantity_requested=quantity,
+                           created_by=user, updated_by=user)
+            for pk, quantity in quantities.items()
+        ])
+        if approve:
+            take_stock(quantities, user, emergency=True)
+            record_consumption({
+                (nurse.pk, pk, nurse.organization_id, timezone.localdate(now)): quantity
+                for pk, quantity in quantities.items()
+            }, "consumed", user)
+
+    return request_obj
+
+
+def update_request_items(request_obj, items_data, user):
+    """
+    Changes the requested quantities of a pending request in one pass.
+
+    The request row is locked while it is still pending, the referenced items
+    are loaded with one in_bulk scoped to the request and checked against the
+    current stock in memory, and the new quantities are written with one
+    bulk_update. The item set does not change, so ``total_items`` stays valid.
+    Routine requests must fit in the stock above the emergency reserve, as on
+    approval; emergency requests may stay pending until stock arrives.
+
+    :param request_obj: pending Request being updated
+    :param items_data: list of dicts with the item ``id`` and ``quantity_requested``; an item
+        without a quantity keeps its current one
+    :param user: CustomUser updating the request
+    :raises ValidationError: if the request was processed, an item is unknown or stock is short
+    """
+    quantities = {}
+    for item_data in items_data:
+        try:
+            pk = uuid.UUID(str(item_data["id"]))
+            quantity = item_data.get("quantity_requested")
+            quantities[pk] = None if quantity is None else int(quantity)
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError({"Details": "Each item needs a valid id and quantity_requested."})
+
+    with transaction.atomic():
+        is_emergency = (Request.objects.select_for_update().filter(pk=request_obj.pk, status="Pending")
+                        .values_list("is_emergency", flat=True).first())
+        if is_emergency is None:
+            raise ValidationError({"Details": "Cannot Update, Request Already Processed."})
+
+        items = RequestedItems.objects.filter(request=request_obj).select_related("inventory__inventory").in_bulk(
+            quantities
+        )
+        for pk, quantity in quantities.items():
+            if pk not in items:
+                raise ValidationError({"Details": f"Item with id {pk} not found in this request."})
+            if quantity is None:
+                quantities[pk] = quantity = items[pk].quantity_requested
+            if quantity < 1:
+                raise ValidationError({"Details": "quantity_requested must be at least 1."})
+
+        short = sorted(items[pk].inventory.inventory.name for pk, quantity in quantities.items()
+                       if quantity > usable_stock((items[pk].inventory.quantity_in_stock,
+                                                   items[pk].inventory.emergency_reserve), False))
+        if short and not is_emergency:
+            raise ValidationError({"Details": INSUFFICIENT_STOCK.format(items=", ".join(short))})
+
+        now = timezone.now()
+        for pk, quantity in quantities.items():
+            items[pk].quantity_requested = quantity
+            items[pk].updated_by = user
+            items[pk].updated = now
+        RequestedItems.objects.bulk_update(items.values(), ["quantity_requested", "updated_by", "updated"])
+
+        request_obj.updated_by = user
+        request_obj.save(update_fields=["updated_by", "updated"])
+
+
+def approve_request(request_obj, user):
+    """
+    Approves a pending request and takes its items out of the organization stock.
+
+    The status change and the stock decrement commit together; the request is
+    only approved if it is still pending, so approving twice never takes stock
+    twice.
+
+    :param request_obj: Request to approve
+    :param user: CustomUser approving the request
+    :raises ValidationError: if the request was already processed or stock is short
+    """
+    with transaction.atomic():
+        now = timezone.now()
+        approved = Request.objects.filter(pk=request_obj.pk, status="Pending").update(
+            status="Approved", approved_by=user, approved_at=now, updated_by=user, updated=now
+        )
+        if not approved:
+            raise ValidationError({"Details": "Request Already Processed."})
+
+        reserve_stock(requested_quantities([request_obj.pk]), user, emergency=request_obj.is_emergency)
+        record_consumption(requested_consumption([request_obj.pk], timezone.localdate(now)), "consumed", user)
+
+
+def process_requests(request_ids, action, organization_id, user):
+    """
+    Approves or rejects a batch of pending requests of one organization.
+
+    The pending requests are locked, and for approvals their items and the
+    affected stock rows are read once. Stock is allocated in queue order,
+    emergencies first and then by age; only emergencies may use the emergency
+    reserve and a request that cannot be served in full is left pending. All
+    decrements are applied with one UPDATE and every status change with one
+    more.
+
+    :param request_ids: primary keys of the requests to process
+    :param action: "Approved" or "Rejected"
+    :param organization_id: organization the acting inventory manager belongs to
+    :param user: CustomUser taking the action
+    :return: dict of request primary key -> outcome
+    """
+    outcomes = dict.fromkeys(request_ids, REQUEST_PROCESSED)
+    with transaction.atomic():
+        pending = sorted(
+            (not is_emergency, created, pk)
+            for is_emergency, created, pk in Request.objects.select_for_update()
+            .filter(pk__in=request_ids, status="Pending", organization_id=organization_id)
+            .order_by("pk")
+            .values_list("is_emergency", "created", "pk")
+        )
+        pending_ids = [pk for _, _, pk in pending]
+        if not pending_ids:
+            return outcomes
+
+        now = timezone.now()
+        if action == "Rejected":
+            Request.objects.filter(pk__in=pending_ids).update(
+                status="Rejected", rejected_by=user, rejected_at=now, updated_by=user, updated=now
+            )
+            outcomes.update(dict.fromkeys(pending_ids, "Rejected"))
+            return outcomes
+
+        needs = defaultdict(lambda: defaultdict(int))
+        for request_id, org_inventory_id, quantity in RequestedItems.objects.filter(
+            request_id__in=pending_ids
+        ).values_list("request_id", "inventory_id", "quantity_requested"):
+            needs[request_id][org_inventory_id] += quantity
+
+        stock = lock_stock({pk for items in needs.values() for pk in items})
+        taken = defaultdict(int)
+        approved_ids = []
+        for routine, _, pk in pending:
+            items = needs[pk]
+            if any(item not in stock or usable_stock(stock[item], not routine) - taken[item] < quantity
+                   for item, quantity in items.items()):
+                outcomes[pk] = INSUFFICIENT_STOCK_OUTCOME
+                continue
+            for item, quantity in items.items():
+                taken[item] += quantity
+            approved_ids.append(pk)
+            outcomes[pk] = "Approved"
+
+        # The allocation above already kept the reserve for routine requests
+        # while holding the row locks.
+        take_stock({item: quantity for item, quantity in taken.items() if quantity}, user, emergency=True)
+        if approved_ids:
+            Request.objects.filter(pk__in=approved_ids).update(
+                status="Approved", approved_by=user, approved_at=now, updated_by=user, updated=now
+            )
+            record_consumption(requested_consumption(approved_ids, timezone.localdate(now)), "consumed", user)
+
+    return outcomes
+
+
+def return_items(returns, user, organization_id=None):
+    """
+    Books the return of reusable items and credits the returned quantities to stock.
+
+    The requested items are locked and validated with one query. Accepted
+    returns increment ``quantity_returned`` with one F() UPDATE and the
+    organization stock is credited with the quantities actually returned, summed
+    per OrgInventory; its rows are locked in primary key order first, like
+    approvals do, and credited in one more UPDATE. Items that are not part of an approved
+    request, not reusable or would be over-returned are reported and skipped.
+
+    Returns are booked in the consumption rollup on the day their request was
+    approved, so they net out against the consumption they belong to and
+    backfill_consumption can rebuild them from the requests alone.
+
+    :param returns: dict of (request primary key, OrgInventory primary key) -> quantity returned
+    :param user: CustomUser booking the return
+    :param organization_id: when given, only requests of this organization are accepted
+    :return: dict of (request primary key, OrgInventory primary key) -> field errors, for the rejected lines
+    """
+    errors = {}
+    match = Q()
+    for request_id, org_inventory_id in returns:
+        match |= Q(request_id=request_id, inventory_id=org_inventory_id)
+
+    with transaction.atomic():
+        items = RequestedItems.objects.select_for_update(of=("self",)).filter(
+            match, request__status="Approved", inventory__inventory__is_reusable=True
+        )
+        if organization_id is not None:
+            items = items.filter(request__organization_id=organization_id)
+        items = {
+            (request_id, org_inventory_id): (pk, requested, returned, nurse_id, item_organization_id, booked_at)
+            for pk, request_id, org_inventory_id, requested, returned, nurse_id, item_organization_id, booked_at
+            in items.order_by("pk").values_list(
+                "pk", "request_id", "inventory_id", "quantity_requested", "quantity_returned",
+                "request__nurse_id", "request__organization_id",
+                Coalesce("request__approved_at", "request__created"),
+            )
+        }
+
+        now = timezone.now()
+        accepted, fully_returned = {}, {}
+        credits, returned_by_nurse = defaultdict(int), defaultdict(int)
+        for key, quantity in returns.items():
+            if key not in items:
+                errors[key] = {"inventory": ITEM_NOT_RETURNABLE}
+                continue
+            pk, requested, returned, nurse_id, item_organization_id, booked_at = items[key]
+            if quantity > requested - returned:
+                errors[key] = {"quantity_returned": RETURN_EXCEEDS_PENDING.format(
+                    pending=requested - returned)}
+                continue
+            accepted[pk] = quantity
+            fully_returned[pk] = returned + quantity == requested
+            credits[key[1]] += quantity
+            returned_by_nurse[(nurse_id, key[1], item_organization_id, timezone.localdate(booked_at))] += quantity
+
+        if accepted:
+            RequestedItems.objects.filter(pk__in=accepted).update(
+                quantity_returned=F("quantity_returned") + value_per_row(accepted),
+                is_returned=value_per_row(fully_returned, BooleanField()),
+                updated_by=user,
+                updated=now,
+            )
+            lock_stock(credits)
+            OrgInventory.objects.filter(pk__in=credits).update(
+                quantity_in_stock=F("quantity_in_stock") + value_per_row(credits),
+                updated_by=user,
+                updated=now,
+            )
+            record_consumption(returned_by_nurse, "returned", user)
+
+    return errors
+
+
+def requested_consumption(request_ids, day):
+    """
+    Sums the requested quantities per nurse and OrgInventory for the given requests.
+
+    :param request_ids: primary keys of the requests
+    :param day: date the consumption is booked on
+    :return: dict of (nurse pk, OrgInventory pk, organization pk, day) -> quantity
+    """
+    return {
+        (nurse_id, org_inventory_id, organization_id, day): quantity
+        for nurse_id, org_inventory_id, organization_id, quantity in RequestedItems.objects.filter(
+            request_id__in=request_ids
+        )
+        .values("request__nurse_id", "inventory_id", "request__organization_id")
+        .annotate(quantity=Sum("quantity_requested"))
+        .order_by()
+        .values_list("request__nurse_id", "inventory_id", "request__organization_id", "quantity")
+    }
+
+
+def record_consumption(quantities, field, user=None):
+    """
+    Adds quantities to the per nurse, item and day consumption rollup.
+
+    Missing rollup rows are inserted first, ignoring the ones a concurrent
+    transaction created meanwhile, and all rows are then incremented with one
+    F() UPDATE, so concurrent approvals and returns never lose a count.
+
+    :param quantities: dict of (nurse pk, OrgInventory pk, organization pk, day) -> quantity
+    :param field: "consumed" or "returned"
+    :param user: CustomUser recorded as the author of the change
+    """
+    quantities = {key: quantity for key, quantity in quantities.items() if quantity}
+    if not quantities:
+        return
+
+    ConsumptionRollup.objects.bulk_create(
+        [
+            ConsumptionRollup(nurse_id=nurse_id, org_inventory_id=org_inventory_id, organization_id=organization_id,
+                              day=day, created_by=user, updated_by=user)
+            for nurse_id, org_inventory_id, organization_id, day in quantities
+        ],
+        ignore_conflicts=True,
+    )
+
+    match, increments = Q(), []
+    for (nurse_id, org_inventory_id, _, day), quantity in quantities.items():
+        row = Q(nurse_id=nurse_id, org_inventory_id=org_inventory_id, day=day)
+        match |= row
+        increments.append(When(row, then=Value(quantity)))
+    ConsumptionRollup.objects.filter(match).update(
+        **{field: F(field) + Case(*increments, default=Value(0), output_field=IntegerField())},
+        updated_by=user,
+        updated=timezone.now(),
+    )
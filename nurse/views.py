@@ -1,22 +1,72 @@
+import uuid
+
 from rest_framework import generics, permissions, status
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 
-from base.pagination import MyLimitOffsetPagination
+from authentication.tokens import user_claims
+from base.pagination import MyCursorPagination, MyLimitOffsetPagination
 from base.role_access import RoleBasedPermission
-from nurse.models import RequestedItems , Request
-from nurse.serializers import RequestSerializer, ReturnableItemSerializer , ReturnInventorySerializer
+from nurse.models import ConsumptionRollup, RequestedItems , Request
+from nurse.serializers import ConsumerSerializer, OutstandingReturnSerializer, RequestBulkActionSerializer, RequestSerializer, ReturnableItemSerializer , \
+    ReturnInventorySerializer, ReturnLineSerializer
+from nurse.constants import (ACTION_TAKEN_SUCCESS, ITEM_RETURN_FAILED, ITEM_RETURNED_SUCCESSFULLY,
+                             OUTSTANDING_RETURNS_FETCHED, PENDING_QUEUE_FETCHED, TOP_CONSUMERS_FETCHED)
+from nurse.utils import (approve_request, parse_created, process_requests, return_items,
+                         update_request_items)
 
 
 # Create your views here.
 
 class RequestedListView(generics.ListAPIView):
-    queryset = Request.objects.all()
     serializer_class = RequestSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly,RoleBasedPermission]
     allowed_roles = ['Inventory Manager','Nurse']
-    pagination_class = MyLimitOffsetPagination
+    pagination_class = MyCursorPagination
+
+    def get_queryset(self):
+        claims = user_claims(self.request.user)
+        if claims['role'] == 'Nurse':
+            queryset = Request.objects.filter(nurse_id=claims['nurse_id'])
+        else:
+            queryset = Request.objects.filter(organization_id=claims['organization_id'])
+
+        params = self.request.query_params
+        if params.get('status'):
+            queryset = queryset.filter(status=params['status'])
+        if params.get('is_emergency'):
+            queryset = queryset.filter(is_emergency=params['is_emergency'].lower() == 'true')
+        for param, lookup in (('created_after', 'created__gte'), ('created_before', 'created__lte')):
+            if params.get(param):
+                queryset = queryset.filter(**{lookup: parse_created(param, params[param])})
+        return queryset.prefetch_related('requested_items')
+
+class RequestQueueView(generics.ListAPIView):
+    serializer_class = RequestSerializer
+    permission_classes = [permissions.IsAuthenticated,RoleBasedPermission]
+    allowed_roles = ['Inventory Manager']
+    max_limit = 100
+
+    def get_queryset(self):
+        try:
+            limit = min(int(self.request.query_params.get('limit', 10)), self.max_limit)
+        except ValueError:
+            raise ValidationError({"limit":"Enter a whole number."})
+
+        return (
+            Request.objects.filter(organization_id=user_claims(self.request.user)['organization_id'],
+                                   status='Pending')
+            .order_by('-is_emergency', 'created', 'id')
+            .prefetch_related('requested_items')[:max(limit, 0)]
+        )
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer(self.get_queryset(), many=True)
+        return Response({"message":PENDING_QUEUE_FETCHED,"data":serializer.data},status=status.HTTP_200_OK)
 
 class RequestActionView(generics.UpdateAPIView):
     queryset = Request.objects.all()
@@ -33,9 +83,10 @@ class RequestActionView(generics.UpdateAPIView):
         action = request.data.get("action")
 
         if action == 'Approved':
-            instance.status = 'Approved'
-            instance.approved_by = request.user
-            instance.approved_at = timezone.now()
+            approve_request(instance, request.user)
+            instance.refresh_from_db()
+            serializer = self.get_serializer(instance)
+            return Response(serializer.data,status=status.HTTP_200_OK)
 
         elif action == 'Rejected':
             instance.status = 'Rejected'
@@ -51,13 +102,33 @@ class RequestActionView(generics.UpdateAPIView):
         serializer = self.get_serializer(instance)
         return Response(serializer.data,status=status.HTTP_200_OK)
 
+class BulkRequestActionView(generics.GenericAPIView):
+    serializer_class = RequestBulkActionSerializer
+    permission_classes = [permissions.IsAuthenticated,RoleBasedPermission]
+    allowed_roles = ['Inventory Manager']
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        organization_id = user_claims(request.user)['organization_id']
+        if organization_id is None:
+            raise NotFound("Inventory Manager not found for the current user.")
+
+        request_ids = list(dict.fromkeys(serializer.validated_data['requests']))
+        outcomes = process_requests(request_ids, serializer.validated_data['action'],
+                                    organization_id, request.user)
+
+        results = [{"id":pk,"outcome":outcome} for pk, outcome in outcomes.items()]
+        return Response({"message":ACTION_TAKEN_SUCCESS,"results":results},status=status.HTTP_200_OK)
+
 class CreateRequestView(generics.CreateAPIView):
     serializer_class = RequestSerializer
     permission_classes = [permissions.IsAuthenticated, RoleBasedPermission]
     allowed_roles = ['Nurse']
 
     def get_queryset(self):
-        return Request.objects.filter(nurse=self.request.user.nurse)
+        return Request.objects.filter(nurse_id=user_claims(self.request.user)['nurse_id'])
 
 class RequestDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Request.objects.all()
@@ -71,21 +142,7 @@ class RequestDetailView(generics.RetrieveUpdateDestroyAPIView):
         if instance.status != 'Pending':
             raise ValidationError({"Details": "Cannot Update, Request Already Processed."})
 
-        items_data = request.data.get("requested_items", [])
-
-        for item_data in items_data:
-            try:
-                requested_item = RequestedItems.objects.get(id=item_data["id"], request=instance)
-                requested_item.quantity_requested = item_data.get("quantity_requested",
-                                                                  requested_item.quantity_requested)
-                requested_item.updated_by = request.user
-                requested_item.save()
-            except RequestedItems.DoesNotExist:
-                raise ValidationError({"Details": f"Item with id {item_data['id']} not found in this request."})
-
-        instance.updated_by = request.user
-        instance.save()
-        instance.update_total()
+        update_request_items(instance, request.data.get("requested_items", []), request.user)
 
         serializer = self.get_serializer(instance)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -115,20 +172,109 @@ class ReturnInventoryView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated, RoleBasedPermission]
     allowed_roles = ['Inventory Manager']
 
+class BulkReturnInventoryView(generics.GenericAPIView):
+    serializer_class = ReturnLineSerializer
+    permission_classes = [permissions.IsAuthenticated, RoleBasedPermission]
+    allowed_roles = ['Inventory Manager']
+
+    def post(self, request, *args, **kwargs):
+        lines = request.data.get('items')
+        if not isinstance(lines, list) or not lines:
+            raise ValidationError({"Details":"Provide a non-empty list of items."})
+
+        organization_id = user_claims(request.user)['organization_id']
+        if organization_id is None:
+            raise NotFound("Inventory Manager not found for the current user.")
+
+        returns, errors = {}, []
+        for index, line in enumerate(lines):
+            serializer = self.get_serializer(data=line)
+            if not serializer.is_valid():
+                errors.append({"line":index,"Error":serializer.errors})
+                continue
+            key = (serializer.validated_data['request'], serializer.validated_data['inventory'])
+            returns[key] = returns.get(key, 0) + serializer.validated_data['quantity_returned']
+
+        rejected = return_items(returns, request.user, organization_id) if returns else {}
+        errors += [{"request":request_id,"inventory":inventory_id,"Error":error}
+                   for (request_id, inventory_id), error in rejected.items()]
+
+        returned = len(returns) - len(rejected)
+        if not returned:
+            return Response({"Error":ITEM_RETURN_FAILED,"errors":errors},status=status.HTTP_400_BAD_REQUEST)
+        return Response({"message":ITEM_RETURNED_SUCCESSFULLY,"returned":returned,"errors":errors},
+                        status=status.HTTP_200_OK)
+
 class ReturnStatusView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly,RoleBasedPermission]
     allowed_roles = ['Inventory Manager']
 
     def retrieve(self, request, *args, **kwargs):
         request_id = self.kwargs.get("request_id")
-        items = RequestedItems.objects.filter(request_id=request_id,
-                                              inventory__inventory__is_reusable=True,)
-        total = sum(item.quantity_requested for item in items)
-        returned = sum(item.quantity_returned for item in items)
-        pending = total - returned
+        totals = RequestedItems.objects.filter(request_id=request_id,
+                                               inventory__inventory__is_reusable=True,).aggregate(
+            total=Coalesce(Sum("quantity_requested"), 0),
+            returned=Coalesce(Sum("quantity_returned"), 0),
+        )
 
         return Response({
-            "total_requested": total,
-            "total_returned": returned,
-            "total_pending": pending,
-        })
\ No newline at end of file
+            "total_requested": totals["total"],
+            "total_returned": totals["returned"],
+            "total_pending": totals["total"] - totals["returned"],
+        })
+
+class OutstandingReturnsView(generics.ListAPIView):
+    serializer_class = OutstandingReturnSerializer
+    permission_classes = [permissions.IsAuthenticated,RoleBasedPermission]
+    allowed_roles = ['Inventory Manager']
+    pagination_class = MyLimitOffsetPagination
+    pagination_message = OUTSTANDING_RETURNS_FETCHED
+
+    def get_queryset(self):
+        return (
+            RequestedItems.objects.filter(request__organization_id=user_claims(self.request.user)['organization_id'],
+                                          request__status="Approved",
+                                          inventory__inventory__is_reusable=True)
+            .values("request_id")
+            .annotate(total_requested=Sum("quantity_requested"), total_returned=Sum("quantity_returned"))
+            .annotate(total_pending=F("total_requested") - F("total_returned"))
+            .filter(total_pending__gt=0)
+            .order_by("request_id")
+        )
+
+class TopConsumersView(generics.ListAPIView):
+    serializer_class = ConsumerSerializer
+    permission_classes = [permissions.IsAuthenticated,RoleBasedPermission]
+    allowed_roles = ['Inventory Manager']
+    max_limit = 100
+
+    def get_queryset(self):
+        params = self.request.query_params
+        try:
+            org_inventory_id = uuid.UUID(params.get('inventory', ''))
+        except ValueError:
+            raise ValidationError({"inventory":"Provide the OrgInventory id of the item."})
+        try:
+            limit = min(int(params.get('limit', 20)), self.max_limit)
+        except ValueError:
+            raise ValidationError({"limit":"Enter a whole number."})
+
+        today = timezone.localdate()
+        start = parse_date(params.get('start', '')) or today.replace(day=1)
+        end = parse_date(params.get('end', '')) or today
+
+        return (
+            ConsumptionRollup.objects.filter(
+                organization_id=user_claims(self.request.user)['organization_id'],
+                org_inventory_id=org_inventory_id,
+                day__range=(start, end))
+            .values('nurse_id')
+            .annotate(first_name=F('nurse__user__first_name'), last_name=F('nurse__user__last_name'),
+                      total_consumed=Sum('consumed'), total_returned=Sum('returned'))
+            .annotate(net_consumed=F('total_consumed') - F('total_returned'))
+            .order_by('-net_consumed', 'nurse_id')[:max(limit, 0)]
+        )
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer(self.get_queryset(), many=True)
+        return Response({"message":TOP_CONSUMERS_FETCHED,"data":serializer.data},status=status.HTTP_200_OK)
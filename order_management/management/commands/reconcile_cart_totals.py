@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
+
+from order_management.models import Cart
+
+
+class Command(BaseCommand):
+    help = "Recomputes cart totals from their items and reports the carts whose stored totals drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Write the recomputed totals to the drifted carts.")
+
+    def handle(self, *args, **options):
+        drifted = list(
+            Cart.objects.annotate(
+                actual_price=Coalesce(Sum("cart_items__total_price"), 0),
+                actual_products=Count("cart_items__inventory", distinct=True),
+            )
+            .exclude(total_price=F("actual_price"), total_products=F("actual_products"))
+            .order_by("pk")
+        )
+
+        for cart in drifted:
+            self.stdout.write(
+                f"Cart {cart.pk}: total_price {cart.total_price} -> {cart.actual_price}, "
+                f"total_products {cart.total_products} -> {cart.actual_products}"
+            )
+            cart.total_price = cart.actual_price
+            cart.total_products = cart.actual_products
+
+        if drifted and options["fix"]:
+            Cart.objects.bulk_update(drifted, ["total_price", "total_products"])
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(drifted)} cart(s)."))
+        else:
+            self.stdout.write(f"{len(drifted)} cart(s) drifted.")
@@ -0,0 +1,25 @@
+from django.db import models
+from django.db.models import Prefetch
+
+
+class OrderQuerySet(models.QuerySet):
+    """
+        QuerySet for Order with the optimized loading used by the order listings.
+    """
+
+    def for_listing(self):
+        """
+        Restricts the orders to the columns OrderSerializer renders and
+        prefetches their items in one extra query, so a page of orders costs
+        the same number of queries whatever its size.
+        """
+        order_item = self.model.order_items.field.model
+        return self.only(
+            "id", "inventory_manager", "total_products", "total_price", "status", "delivered_by",
+            "confirmed_by", "created",
+        ).prefetch_related(
+            Prefetch(
+                "order_items",
+                queryset=order_item.objects.only("id", "order", "inventory", "quantity", "unit_price", "total_price"),
+            )
+        )
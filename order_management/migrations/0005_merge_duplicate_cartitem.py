@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:27
+
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    """
+    Collapses CartItem rows that share a (cart, inventory) pair into the oldest
+    row so the unique constraint added next can be created.
+    """
+    CartItem = apps.get_model("order_management", "CartItem")
+
+    duplicates = (
+        CartItem.objects.values("cart_id", "inventory_id")
+        .annotate(rows=Count("id"), quantity=Sum("quantity"), total_price=Sum("total_price"))
+        .filter(rows__gt=1)
+    )
+    for duplicate in duplicates:
+        rows = CartItem.objects.filter(
+            cart_id=duplicate["cart_id"], inventory_id=duplicate["inventory_id"]
+        ).order_by("created")
+        keeper = rows.first()
+        rows.exclude(pk=keeper.pk).delete()
+        keeper.quantity = duplicate["quantity"]
+        keeper.total_price = duplicate["total_price"]
+        keeper.save(update_fields=["quantity", "total_price"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("order_management", "0004_order_confirmed_at_order_delivered_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+    ]
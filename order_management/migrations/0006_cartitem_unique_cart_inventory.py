@@ -0,0 +1,22 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("order_management", "0005_merge_duplicate_cartitem"),
+        ("supplier", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="cartitem",
+            constraint=models.UniqueConstraint(
+                fields=("cart", "inventory"), name="unique_cart_inventory"
+            ),
+        ),
+    ]
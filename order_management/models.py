@@ -1,7 +1,9 @@
 from django.db import models
+from django.db.models import F
 from base.models import BaseModel
 from authentication.models import CustomUser
 from main_admin.models import InventoryManager
+from order_management.manager import OrderQuerySet
 from supplier.models import Inventory
 
 
@@ -21,20 +23,39 @@ class CartItem(BaseModel):
     quantity = models.PositiveIntegerField(default=1)
     total_price = models.PositiveIntegerField(default=0)
 
+    # Line total as last written to the database, used to apply cart deltas.
+    _saved_total_price = 0
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["cart", "inventory"], name="unique_cart_inventory"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_total_price = instance.__dict__.get("total_price", 0)
+        return instance
+
     def save(self, *args, **kwargs):
+        adding = self._state.adding
         self.total_price = self.quantity * self.inventory.unit_price
         super().save(*args, **kwargs)
-        self.update_cart_totals()
+        self.update_cart_totals(self.total_price - self._saved_total_price, 1 if adding else 0)
+        self._saved_total_price = self.total_price
 
     def delete(self, *args, **kwargs):
-        super().delete(*args, **kwargs)
-        self.update_cart_totals()
-
-    def update_cart_totals(self):
-        cart_items = self.cart.cart_items.all()
-        self.cart.total_price = sum(item.total_price for item in cart_items)
-        self.cart.total_products = cart_items.values("inventory").distinct().count()
-        self.cart.save()
+        result = super().delete(*args, **kwargs)
+        self.update_cart_totals(-self._saved_total_price, -1)
+        return result
+
+    def update_cart_totals(self, price_delta, products_delta):
+        """Applies the change of this single line to the cart totals with one UPDATE."""
+        if price_delta or products_delta:
+            Cart.objects.filter(pk=self.cart_id).update(
+                total_price=F("total_price") + price_delta,
+                total_products=F("total_products") + products_delta,
+            )
 
     def __str__(self):
         return f"{self.inventory.name} - {self.quantity}"
@@ -53,6 +74,8 @@ class Order(BaseModel):
     confirmed_by = models.ForeignKey(CustomUser,null=True,blank=True,on_delete=models.CASCADE,related_name='confirmed_by')
     delivered_by = models.ForeignKey(CustomUser,null=True,blank=True, on_delete=models.CASCADE, related_name='delivered_by')
 
+    objects = OrderQuerySet.as_manager()
+
     def update_totals(self):
         self.total_price = sum(item.total_price for item in self.order_items.all())
         self.total_products =self.order_items.count()
@@ -14,6 +14,14 @@ class CartSerializer(serializers.ModelSerializer):
         model = Cart
         fields = ['id','inventory_manager','total_products','total_price','cart_items']
 
+class CartLineSerializer(serializers.Serializer):
+    inventory_id = serializers.UUIDField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+class OrderTransitionSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    status = serializers.ChoiceField(choices=["Delivered", "Confirmed"])
+
 class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderItem
@@ -1,3 +1,365 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from authentication.models import CustomUser
+from base.testing import MediaRootTestMixin
+from inventory_manager.models import OrgInventory
+from main_admin.models import InventoryCategory, InventoryManager, Organization
+from order_management.models import Cart, CartItem, Order, OrderItem
+from order_management.utils import confirm_orders
+from supplier.models import Inventory
+
+
+class OrderTestCase(MediaRootTestMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.im_user = CustomUser.objects.create(email="im@example.com", first_name="Inv", last_name="Manager",
+                                                phone_number="1000", role="Inventory Manager")
+        cls.organization = Organization.objects.create(name="City Hospital", email="city@example.com",
+                                                       address="Main Street")
+        cls.inventory_manager = InventoryManager.objects.create(user=cls.im_user, organization=cls.organization)
+        cls.category = InventoryCategory.objects.create(name="Consumables")
+        cls.supplier = cls.create_supplier(0)
+
+    @classmethod
+    def create_supplier(cls, index):
+        return CustomUser.objects.create(email=f"supplier{index}@example.com", first_name="Supplier",
+                                         last_name=str(index), phone_number=f"2{index:03}", role="Supplier")
+
+    def fill_cart(self, lines, suppliers=None):
+        suppliers = suppliers or [self.supplier]
+        cart, _ = Cart.objects.get_or_create(inventory_manager=self.inventory_manager)
+        inventories = Inventory.objects.bulk_create([
+            Inventory(name=f"Item {i}", supplier=suppliers[i % len(suppliers)], category=self.category,
+                      unit_price=10, quantity=100)
+            for i in range(lines)
+        ])
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, inventory=inventory, supplier=inventory.supplier, quantity=2, total_price=20)
+            for inventory in inventories
+        ])
+        Cart.objects.filter(pk=cart.pk).update(total_price=20 * lines, total_products=lines)
+        return cart
+
+    def checkout(self):
+        client = APIClient()
+        client.force_authenticate(self.im_user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(reverse("order-create"))
+        return response, len(queries)
+
+
+class CartTotalsTests(OrderTestCase):
+
+    def test_cart_item_changes_apply_deltas_to_cart_totals(self):
+        cart = Cart.objects.create(inventory_manager=self.inventory_manager)
+        gloves, syringes = [
+            Inventory.objects.create(name=name, supplier=self.supplier, category=self.category, unit_price=price,
+                                     quantity=100)
+            for name, price in (("Gloves", 10), ("Syringes", 4))
+        ]
+
+        CartItem.objects.create(cart=cart, inventory=gloves, supplier=self.supplier, quantity=2)
+        syringes_item = CartItem.objects.create(cart=cart, inventory=syringes, supplier=self.supplier, quantity=5)
+        cart.refresh_from_db()
+        self.assertEqual((cart.total_price, cart.total_products), (40, 2))
+
+        syringes_item = CartItem.objects.get(pk=syringes_item.pk)
+        syringes_item.quantity = 1
+        syringes_item.save()
+        cart.refresh_from_db()
+        self.assertEqual((cart.total_price, cart.total_products), (24, 2))
+
+        syringes_item.delete()
+        cart.refresh_from_db()
+        self.assertEqual((cart.total_price, cart.total_products), (20, 1))
+
+    def test_reconcile_command_fixes_drifted_totals(self):
+        cart = self.fill_cart(3)
+        Cart.objects.filter(pk=cart.pk).update(total_price=7, total_products=9)
+
+        call_command("reconcile_cart_totals", "--fix", stdout=StringIO())
+
+        cart.refresh_from_db()
+        self.assertEqual((cart.total_price, cart.total_products), (60, 3))
+
+
+class BulkAddToCartTests(OrderTestCase):
+
+    def add_lines(self, lines):
+        client = APIClient()
+        client.force_authenticate(self.im_user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(reverse("cart-inventory-bulk"), {"lines": lines}, format="json")
+        return response, len(queries)
+
+    def create_inventories(self, count, quantity=100):
+        return Inventory.objects.bulk_create([
+            Inventory(name=f"Item {i}", supplier=self.supplier, category=self.category, unit_price=10,
+                      quantity=quantity)
+            for i in range(count)
+        ])
+
+    def test_bulk_add_merges_lines_and_reports_errors(self):
+        gloves, syringes = self.create_inventories(2, quantity=5)
+        cart = self.fill_cart(0)
+        CartItem.objects.create(cart=cart, inventory=gloves, supplier=self.supplier, quantity=1,
+                                created_by=self.im_user)
+
+        response, _ = self.add_lines([
+            {"inventory_id": str(gloves.pk), "quantity": 2},
+            {"inventory_id": str(syringes.pk), "quantity": 3},
+            {"inventory_id": str(gloves.pk), "quantity": 3},
+            {"inventory_id": str(gloves.pk), "quantity": 1},
+            {"inventory_id": "not-a-uuid"},
+        ])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([error["line"] for error in response.data["errors"]], [2, 4])
+        self.assertEqual(CartItem.objects.get(inventory=gloves).quantity, 4)
+        self.assertEqual(CartItem.objects.get(inventory=syringes).quantity, 3)
+        cart.refresh_from_db()
+        self.assertEqual((cart.total_price, cart.total_products), (70, 2))
+
+    def test_bulk_add_query_count_is_constant(self):
+        # Line counts stay below SQLite's bulk insert batch limit.
+        self.fill_cart(0)
+        _, small_batch_queries = self.add_lines([
+            {"inventory_id": str(inventory.pk), "quantity": 1} for inventory in self.create_inventories(1)
+        ])
+        response, large_batch_queries = self.add_lines([
+            {"inventory_id": str(inventory.pk), "quantity": 1} for inventory in self.create_inventories(90)
+        ])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["added"], 90)
+        self.assertEqual(small_batch_queries, large_batch_queries)
+
+
+class CheckoutQueryCountTests(OrderTestCase):
+
+    def test_checkout_creates_order_and_clears_cart(self):
+        cart = self.fill_cart(3)
+
+        response, _ = self.checkout()
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual(order.total_price, 60)
+        self.assertEqual(order.total_products, 3)
+        self.assertEqual(OrderItem.objects.filter(order=order).count(), 3)
+        cart.refresh_from_db()
+        self.assertEqual((cart.total_price, cart.total_products), (0, 0))
+        self.assertFalse(cart.cart_items.exists())
+
+    def test_checkout_query_count_is_constant(self):
+        # Cart sizes stay below SQLite's bulk insert batch limit so the count is
+        # comparable on every backend.
+        self.fill_cart(1)
+        _, small_cart_queries = self.checkout()
+
+        self.fill_cart(90)
+        response, large_cart_queries = self.checkout()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(small_cart_queries, large_cart_queries)
+
+
+class MultiSupplierCheckoutTests(OrderTestCase):
+
+    def test_checkout_creates_one_order_per_supplier(self):
+        suppliers = [self.supplier, self.create_supplier(1)]
+        self.fill_cart(5, suppliers)
+
+        response, _ = self.checkout()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 2)
+        for supplier in suppliers:
+            order = Order.objects.get(supplier=supplier)
+            items = OrderItem.objects.filter(order=order)
+            self.assertTrue(all(item.inventory.supplier_id == supplier.id for item in items))
+            self.assertEqual(order.total_products, items.count())
+            self.assertEqual(order.total_price, 20 * items.count())
+
+    def test_checkout_query_count_does_not_grow_with_suppliers(self):
+        suppliers = [self.supplier] + [self.create_supplier(i) for i in range(1, 50)]
+        query_counts = []
+
+        for supplier_count in (1, 10, 50):
+            self.fill_cart(50, suppliers[:supplier_count])
+            response, queries = self.checkout()
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(len(response.data), supplier_count)
+            query_counts.append(queries)
+
+        self.assertEqual(len(set(query_counts)), 1)
+
+
+class OrderConfirmationTests(OrderTestCase):
+
+    def place_delivered_order(self, lines):
+        self.fill_cart(lines)
+        self.checkout()
+        order = Order.objects.latest("created")
+        Order.objects.filter(pk=order.pk).update(status="Delivered")
+        return order
+
+    def confirm(self, order):
+        client = APIClient()
+        client.force_authenticate(self.im_user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.patch(reverse("order-update-status", args=[order.pk]), {"status": "Confirmed"})
+        return response, len(queries)
+
+    def test_confirmation_moves_stock_once(self):
+        order = self.place_delivered_order(3)
+
+        response, _ = self.confirm(order)
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        order.save()
+        confirm_orders([order.pk], self.im_user)
+
+        self.assertEqual(order.status, "Confirmed")
+        for item in order.order_items.select_related("inventory"):
+            self.assertEqual(item.inventory.quantity, 98)
+            stock = OrgInventory.objects.get(inventory=item.inventory, organization=self.organization)
+            self.assertEqual(stock.quantity_in_stock, 2)
+
+    def test_confirmation_adds_to_existing_org_stock(self):
+        order = self.place_delivered_order(1)
+        inventory = order.order_items.get().inventory
+        OrgInventory.objects.create(inventory=inventory, organization=self.organization, quantity_in_stock=5)
+
+        self.confirm(order)
+
+        stock = OrgInventory.objects.get(inventory=inventory, organization=self.organization)
+        self.assertEqual(stock.quantity_in_stock, 7)
+
+    def test_confirmation_query_count_is_constant(self):
+        _, small_order_queries = self.confirm(self.place_delivered_order(1))
+        _, large_order_queries = self.confirm(self.place_delivered_order(90))
+
+        self.assertEqual(small_order_queries, large_order_queries)
+
+
+class BulkOrderUpdateTests(OrderTestCase):
+
+    def place_orders(self, count, supplier=None):
+        supplier = supplier or self.supplier
+        inventory = Inventory.objects.create(name="Gloves", supplier=supplier, category=self.category,
+                                             unit_price=10, quantity=1000)
+        orders = Order.objects.bulk_create([
+            Order(supplier=supplier, inventory_manager=self.inventory_manager, total_price=20, total_products=1)
+            for _ in range(count)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, inventory=inventory, quantity=2, unit_price=10, total_price=20)
+            for order in orders
+        ])
+        return orders, inventory
+
+    def update_statuses(self, user, orders, new_status):
+        client = APIClient()
+        client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.patch(reverse("order-update-status-bulk"),
+                                    {"orders": [{"id": str(order.pk), "status": new_status} for order in orders]},
+                                    format="json")
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_bulk_transitions_apply_valid_orders_and_report_the_rest(self):
+        orders, inventory = self.place_orders(3)
+        foreign_orders, _ = self.place_orders(1, supplier=self.create_supplier(1))
+        Order.objects.filter(pk=orders[2].pk).update(status="Delivered")
+
+        response, _ = self.update_statuses(self.supplier, orders + foreign_orders, "Delivered")
+
+        errors = [result for result in response.data["results"] if "Error" in result]
+        self.assertEqual([error["id"] for error in errors], [orders[2].pk, foreign_orders[0].pk])
+        self.assertEqual(Order.objects.filter(status="Delivered", delivered_by=self.supplier).count(), 2)
+
+        self.update_statuses(self.im_user, orders, "Confirmed")
+
+        self.assertEqual(Order.objects.filter(status="Confirmed").count(), 3)
+        inventory.refresh_from_db()
+        self.assertEqual(inventory.quantity, 994)
+        stock = OrgInventory.objects.get(inventory=inventory, organization=self.organization)
+        self.assertEqual(stock.quantity_in_stock, 6)
+
+    def test_bulk_transition_query_count_is_constant(self):
+        query_counts = []
+        for count in (1, 90):
+            orders, _ = self.place_orders(count)
+            _, delivered_queries = self.update_statuses(self.supplier, orders, "Delivered")
+            _, confirmed_queries = self.update_statuses(self.im_user, orders, "Confirmed")
+            query_counts.append((delivered_queries, confirmed_queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+
+class OrderListingQueryCountTests(OrderTestCase):
+
+    def create_orders(self, count):
+        inventory = Inventory.objects.create(name="Gloves", supplier=self.supplier, category=self.category,
+                                             unit_price=10, quantity=100)
+        orders = Order.objects.bulk_create([
+            Order(supplier=self.supplier, inventory_manager=self.inventory_manager, total_price=20, total_products=1)
+            for _ in range(count)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, inventory=inventory, quantity=2, unit_price=10, total_price=20)
+            for order in orders
+        ])
+
+    def list_orders(self, url_name, user, limit):
+        client = APIClient()
+        client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse(url_name), {"limit": limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["data"]), limit)
+        self.assertEqual(len(response.data["data"][0]["order_items"]), 1)
+        return len(queries)
+
+    def test_order_listings_query_count_is_constant(self):
+        self.create_orders(500)
+
+        for url_name, user in (("Inventory-Manager-Order", self.im_user), ("supplier-order", self.supplier),
+                               ("order-create", self.im_user)):
+            with self.subTest(url_name=url_name):
+                query_counts = {self.list_orders(url_name, user, limit) for limit in (5, 50, 500)}
+                self.assertEqual(len(query_counts), 1)
+
+    def test_cursor_pages_cover_every_order_once(self):
+        self.create_orders(12)
+        client = APIClient()
+        client.force_authenticate(self.im_user)
+
+        response = client.get(reverse("Inventory-Manager-Order"), {"limit": 5})
+        self.assertEqual(response.data["count"], 12)
+        seen = [order["id"] for order in response.data["data"]]
+        while response.data["next"]:
+            response = client.get(response.data["next"])
+            self.assertIsNone(response.data["count"])
+            seen += [order["id"] for order in response.data["data"]]
+        self.assertEqual(len(seen), 12)
+        self.assertEqual(len(set(seen)), 12)
+
+        response = client.get(reverse("Inventory-Manager-Order"), {"count": "false"})
+        self.assertIsNone(response.data["count"])
+        response = client.get(f"{response.data['next']}&count=true")
+        self.assertIsNotNone(response.data["previous"])
+        self.assertEqual(response.data["count"], 12)
 
-# Create your tests here.
+        response = client.get(reverse("Inventory-Manager-Order"), {"limit": 5, "offset": 10})
+        self.assertEqual(response.data["count"], 12)
+        self.assertEqual(len(response.data["data"]), 2)
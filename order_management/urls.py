@@ -1,12 +1,14 @@
 from django.urls import path
 
-from order_management.views import CartDetailView, AddToCartView, UpdateToCartView , OrderUpdateView , OrderCreateView
+from order_management.views import CartDetailView, AddToCartView, BulkAddToCartView, UpdateToCartView , OrderUpdateView , OrderCreateView, BulkOrderUpdateView
 
 urlpatterns = [
     path('v1/cart',CartDetailView.as_view(),name='cart-detail'),
     path('v1/cart/inventory/',AddToCartView.as_view(),name='cart-inventory'),
+    path('v1/cart/inventory/bulk',BulkAddToCartView.as_view(),name='cart-inventory-bulk'),
     path('v1/cart/inventory/<uuid:pk>',UpdateToCartView.as_view(),name='cart-update-delete'),
     path('v1/order',OrderCreateView.as_view(),name='order-create'),
+    path('v1/order/update-status/bulk',BulkOrderUpdateView.as_view(),name='order-update-status-bulk'),
     path('v1/order/update-status/<uuid:pk>',OrderUpdateView.as_view(),name='order-update-status'),
 
 ]
\ No newline at end of file
@@ -0,0 +1,288 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from base.utils import value_per_row
+from inventory_manager.models import OrgInventory
+from order_management.models import Cart, CartItem, Order, OrderItem
+from supplier.models import Inventory
+
+
+def add_cart_lines(cart, lines, user):
+    """
+    Adds a batch of lines to the cart with a fixed number of queries.
+
+    The cart row is locked, every referenced Inventory is fetched with one
+    in_bulk and the lines are validated in memory in the order they were sent,
+    so several lines for the same inventory add up. Valid lines are upserted
+    with one bulk insert and the cart totals are updated once; invalid lines
+    are skipped and reported.
+
+    :param cart: Cart the lines are added to
+    :param lines: list of dicts with ``inventory_id`` and ``quantity``
+    :param user: CustomUser adding the lines
+    :return: tuple of (number of cart lines written, list of per-line errors)
+    """
+    errors = []
+    with transaction.atomic():
+        cart = Cart.objects.select_for_update().get(pk=cart.pk)
+        inventory_ids = {line["inventory_id"] for line in lines}
+        inventories = Inventory.objects.in_bulk(inventory_ids)
+        existing = {
+            inventory_id: (quantity, total_price)
+            for inventory_id, quantity, total_price in cart.cart_items.filter(inventory_id__in=inventory_ids)
+            .values_list("inventory_id", "quantity", "total_price")
+        }
+
+        quantities = {inventory_id: quantity for inventory_id, (quantity, _) in existing.items()}
+        for index, line in enumerate(lines):
+            inventory = inventories.get(line["inventory_id"])
+            if inventory is None:
+                errors.append({"line": index, "inventory_id": line["inventory_id"],
+                               "Error": "Inventory ID not found."})
+                continue
+            quantity = quantities.get(inventory.pk, 0) + line["quantity"]
+            if quantity > inventory.quantity:
+                errors.append({"line": index, "inventory_id": inventory.pk,
+                               "Error": "Total quantity exceeds available stock."})
+                continue
+            quantities[inventory.pk] = quantity
+
+        cart_items = [
+            CartItem(
+                cart_id=cart.pk,
+                inventory=inventories[inventory_id],
+                supplier_id=inventories[inventory_id].supplier_id,
+                quantity=quantity,
+                total_price=quantity * inventories[inventory_id].unit_price,
+                created_by=user,
+                updated_by=user,
+            )
+            for inventory_id, quantity in quantities.items()
+            if existing.get(inventory_id, (None,))[0] != quantity
+        ]
+        if not cart_items:
+            return 0, errors
+
+        CartItem.objects.bulk_create(
+            cart_items,
+            update_conflicts=True,
+            unique_fields=["cart", "inventory"],
+            update_fields=["quantity", "total_price", "updated_by", "updated"],
+        )
+        Cart.objects.filter(pk=cart.pk).update(
+            total_price=F("total_price")
+            + sum(item.total_price - existing.get(item.inventory_id, (0, 0))[1] for item in cart_items),
+            total_products=F("total_products")
+            + sum(1 for item in cart_items if item.inventory_id not in existing),
+            updated_by=user,
+            updated=timezone.now(),
+        )
+
+    return len(cart_items), errors
+
+
+def checkout_cart(cart, user):
+    """
+    Converts the cart lines into orders, one per supplier, and empties the cart.
+
+    Everything runs in one transaction: cart lines are grouped by their supplier
+    in a single aggregate query, the orders and their items are written with bulk
+    inserts and the cart is cleared with one delete, so the number of queries
+    depends neither on the cart size nor on the number of suppliers.
+
+    :param cart: Cart instance being checked out
+    :param user: CustomUser placing the order
+    :return: list of created Orders, empty if the cart turned out to be empty
+    """
+    with transaction.atomic():
+        cart = Cart.objects.select_for_update().get(pk=cart.pk)
+        supplier_totals = (
+            cart.cart_items.values("supplier")
+            .annotate(total_price=Coalesce(Sum("total_price"), 0), total_products=Count("inventory", distinct=True))
+            .order_by("supplier")
+        )
+
+        orders = Order.objects.bulk_create([
+            Order(
+                supplier_id=totals["supplier"],
+                inventory_manager_id=cart.inventory_manager_id,
+                total_price=totals["total_price"],
+                total_products=totals["total_products"],
+                created_by=user,
+                updated_by=user,
+            )
+            for totals in supplier_totals
+        ])
+        if not orders:
+            return []
+
+        orders_by_supplier = {order.supplier_id: order for order in orders}
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=orders_by_supplier[item.supplier_id],
+                inventory=item.inventory,
+                quantity=item.quantity,
+                unit_price=item.inventory.unit_price,
+                total_price=item.total_price,
+                created_by=user,
+                updated_by=user,
+            )
+            for item in cart.cart_items.select_related("inventory")
+        ])
+
+        cart.cart_items.all().delete()
+        Cart.objects.filter(pk=cart.pk).update(total_price=0, total_products=0, updated_by=user,
+                                               updated=timezone.now())
+
+    return orders
+
+
+# Target status -> status an order must be in to move to it.
+ORDER_TRANSITIONS = {"Delivered": "Pending", "Confirmed": "Delivered"}
+
+
+def transition_orders(transitions, user):
+    """
+    Applies a batch of order status transitions.
+
+    The orders are locked and checked against the Pending -> Delivered ->
+    Confirmed rules with one query. Valid transitions are applied with one
+    UPDATE per target status and the stock of every confirmed order is moved
+    in one pass; invalid ones are reported and left untouched.
+
+    :param transitions: dict of order primary key -> target status
+    :param user: Supplier delivering or Inventory Manager confirming the orders
+    :return: dict of order primary key -> error message, for the rejected orders
+    """
+    errors = {}
+    targets = {"Delivered": [], "Confirmed": []}
+    with transaction.atomic():
+        orders = {
+            order["id"]: order
+            for order in Order.objects.select_for_update(of=("self",))
+            .filter(pk__in=transitions)
+            .order_by("pk")
+            .values("id", "status", "supplier_id", "inventory_manager__user_id")
+        }
+        for pk, new_status in transitions.items():
+            order = orders.get(pk)
+            if order is None:
+                errors[pk] = "Order not found."
+            elif new_status not in ORDER_TRANSITIONS:
+                errors[pk] = "Invalid status Update."
+            elif new_status == "Delivered" and (user.role != "Supplier" or order["supplier_id"] != user.pk):
+                errors[pk] = "Only supplier can update status to delivered"
+            elif new_status == "Confirmed" and (user.role != "Inventory Manager"
+                                                 or order["inventory_manager__user_id"] != user.pk):
+                errors[pk] = "Only the assigned inventory manager can confirm this order"
+            elif order["status"] != ORDER_TRANSITIONS[new_status]:
+                errors[pk] = f"Only {ORDER_TRANSITIONS[new_status].lower()} orders can be {new_status.lower()}"
+            else:
+                targets[new_status].append(pk)
+
+        if targets["Delivered"]:
+            now = timezone.now()
+            Order.objects.filter(pk__in=targets["Delivered"], status="Pending").update(
+                status="Delivered", delivered_by=user, delivered_at=now, updated_by=user, updated=now
+            )
+        if targets["Confirmed"]:
+            confirm_orders(targets["Confirmed"], user)
+
+    return errors
+
+
+def confirm_orders(order_ids, user):
+    """
+    Moves delivered orders to Confirmed and applies their stock movement.
+
+    The status transition is the idempotency key: only orders that are still
+    Delivered are confirmed, so repeating the call, or saving a confirmed order
+    later, never moves stock twice.
+
+    :param order_ids: primary keys of the orders to confirm
+    :param user: CustomUser confirming the orders
+    :return: list of primary keys of the orders that were confirmed by this call
+    """
+    with transaction.atomic():
+        confirmed_ids = list(
+            Order.objects.select_for_update()
+            .filter(pk__in=order_ids, status="Delivered")
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        if not confirmed_ids:
+            return []
+
+        now = timezone.now()
+        Order.objects.filter(pk__in=confirmed_ids).update(
+            status="Confirmed", confirmed_by=user, confirmed_at=now, updated_by=user, updated=now
+        )
+        apply_stock_movement(confirmed_ids, user)
+
+    return confirmed_ids
+
+
+def apply_stock_movement(order_ids, user):
+    """
+    Moves the ordered quantities from the suppliers' inventory into the stock of
+    the ordering organizations.
+
+    Quantities are summed per inventory and organization in SQL and the supplier
+    inventory is decremented with one F() UPDATE. Missing organization stock rows
+    are inserted at zero first, ignoring the ones a concurrent confirmation created
+    meanwhile; all rows are then locked in primary key order and incremented with
+    one F() UPDATE, so concurrent confirmations never overwrite each other.
+
+    :param order_ids: primary keys of the orders whose items are moved
+    :param user: CustomUser recorded as the author of the stock change
+    """
+    movements = list(
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .values("inventory_id", organization=F("order__inventory_manager__organization_id"))
+        .annotate(quantity=Sum("quantity"))
+        .order_by("inventory_id", "organization")
+    )
+    if not movements:
+        return
+
+    supplier_quantities = defaultdict(int)
+    for movement in movements:
+        supplier_quantities[movement["inventory_id"]] += movement["quantity"]
+
+    now = timezone.now()
+    Inventory.objects.filter(pk__in=supplier_quantities).update(
+        quantity=F("quantity") - value_per_row(supplier_quantities), updated_by=user, updated=now
+    )
+
+    OrgInventory.objects.bulk_create(
+        [
+            OrgInventory(
+                inventory_id=movement["inventory_id"],
+                organization_id=movement["organization"],
+                quantity_in_stock=0,
+                created_by=user,
+                updated_by=user,
+            )
+            for movement in movements
+        ],
+        ignore_conflicts=True,
+    )
+
+    quantities = {(movement["inventory_id"], movement["organization"]): movement["quantity"]
+                  for movement in movements}
+    increments = {
+        pk: quantities[(inventory_id, organization_id)]
+        for pk, inventory_id, organization_id in OrgInventory.objects.select_for_update()
+        .filter(inventory_id__in=supplier_quantities,
+                organization_id__in={movement["organization"] for movement in movements})
+        .order_by("pk")
+        .values_list("pk", "inventory_id", "organization_id")
+        if (inventory_id, organization_id) in quantities
+    }
+    OrgInventory.objects.filter(pk__in=increments).update(
+        quantity_in_stock=F("quantity_in_stock") + value_per_row(increments), updated_by=user, updated=now
+    )
@@ -1,12 +1,14 @@
+from django.db.models import prefetch_related_objects
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 
-from base.pagination import MyLimitOffsetPagination
+from base.pagination import MyCursorPagination
 from base.role_access import RoleBasedPermission
-from order_management.serializers import CartSerializer, OrderSerializer
-from order_management.models import Cart, CartItem , Order , OrderItem
+from order_management.serializers import CartLineSerializer, CartSerializer, OrderSerializer, OrderTransitionSerializer
+from order_management.models import Cart, CartItem , Order
+from order_management.utils import add_cart_lines, checkout_cart, confirm_orders, transition_orders
 from main_admin.models import InventoryManager
 from rest_framework.exceptions import NotFound
 from supplier.models import Inventory
@@ -70,9 +72,47 @@ class AddToCartView(generics.CreateAPIView):
             cart_item.save()
 
         cart.updated_by = user
-        cart.save()
+        cart.save(update_fields=["updated_by", "updated"])
         return Response(({"message":"Item added to cart."},request.data),status=status.HTTP_201_CREATED)
 
+class BulkAddToCartView(generics.CreateAPIView):
+    serializer_class = CartLineSerializer
+    permission_classes = (permissions.IsAuthenticatedOrReadOnly, RoleBasedPermission)
+    allowed_roles = ['Inventory Manager']
+
+    def create(self, request, *args, **kwargs):
+        user = request.user
+        lines = request.data.get('lines')
+        if not isinstance(lines, list) or not lines:
+            return Response({"Error":"Provide a non-empty list of lines."},status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            inventory_manager = InventoryManager.objects.get(user=user)
+        except InventoryManager.DoesNotExist:
+            raise NotFound("Inventory Manager not found for the current user.")
+
+        cart,_ = Cart.objects.get_or_create(inventory_manager=inventory_manager,
+                                            defaults={"created_by":user , "updated_by":user})
+
+        valid_lines, positions, errors = [], [], []
+        for index, line in enumerate(lines):
+            serializer = self.get_serializer(data=line)
+            if serializer.is_valid():
+                valid_lines.append(serializer.validated_data)
+                positions.append(index)
+            else:
+                errors.append({"line":index,"Error":serializer.errors})
+
+        added, line_errors = add_cart_lines(cart, valid_lines, user) if valid_lines else (0, [])
+        for error in line_errors:
+            error["line"] = positions[error["line"]]
+        errors = sorted(errors + line_errors, key=lambda error: error["line"])
+
+        if not added:
+            return Response({"Error":"No items added to cart.","errors":errors},status=status.HTTP_400_BAD_REQUEST)
+        return Response({"message":"Items added to cart.","added":added,"errors":errors},
+                        status=status.HTTP_201_CREATED)
+
 class UpdateToCartView(generics.UpdateAPIView,generics.DestroyAPIView):
     serializer_class = CartSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly, RoleBasedPermission)
@@ -99,7 +139,7 @@ class UpdateToCartView(generics.UpdateAPIView,generics.DestroyAPIView):
         cart_item.save()
 
         cart_item.cart.updated_by = user
-        cart_item.cart.save()
+        cart_item.cart.save(update_fields=["updated_by", "updated"])
 
         return Response({"message":"Cart Item updated."},status=status.HTTP_200_OK)
 
@@ -112,16 +152,16 @@ class UpdateToCartView(generics.UpdateAPIView,generics.DestroyAPIView):
         cart_item.delete()
 
         cart.updated_by = user
-        cart.save()
+        cart.save(update_fields=["updated_by", "updated"])
 
         return Response({"message":"Cart Item Removed."},status=status.HTTP_204_NO_CONTENT)
 
 class OrderCreateView(generics.ListCreateAPIView):
-    queryset = Order.objects.all()
+    queryset = Order.objects.for_listing().order_by("-created")
     serializer_class = OrderSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly, RoleBasedPermission)
     allowed_roles = ['Inventory Manager']
-    pagination_class = MyLimitOffsetPagination
+    pagination_class = MyCursorPagination
 
     def create(self, request, *args, **kwargs):
         user = request.user
@@ -132,40 +172,16 @@ class OrderCreateView(generics.ListCreateAPIView):
         if not cart.cart_items.exists():
             return Response({"Error":"Cart is Empty , Items does not exist."},status=status.HTTP_400_BAD_REQUEST)
 
-        supplier = cart.cart_items.first().inventory.supplier
-
-        order = Order.objects.create(
-            supplier = supplier,
-            inventory_manager = inventory_manager,
-            total_price=cart.total_price,
-            total_products=cart.total_products,
-            created_by=user,
-            updated_by=user,
-        )
-
-        for item in cart.cart_items.all():
-            OrderItem.objects.create(
-                order=order,
-                inventory=item.inventory,
-                quantity=item.quantity,
-                unit_price=item.inventory.unit_price,
-                total_price=item.total_price,
-                created_by=user,
-                updated_by=user,
-            )
-
-
-        cart.cart_items.all().delete()
-        cart.total_price = 0
-        cart.total_products = 0
-        cart.updated_by = user
-        cart.save()
+        orders = checkout_cart(cart, user)
+        if not orders:
+            return Response({"Error":"Cart is Empty , Items does not exist."},status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(OrderSerializer(order).data,status=status.HTTP_201_CREATED)
+        prefetch_related_objects(orders, "order_items")
+        return Response(OrderSerializer(orders, many=True).data,status=status.HTTP_201_CREATED)
 
 class OrderUpdateView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = OrderSerializer
-    queryset = Order.objects.all()
+    queryset = Order.objects.select_related('inventory_manager')
     permission_classes = (permissions.IsAuthenticatedOrReadOnly, RoleBasedPermission)
     allowed_roles = ['Inventory Manager','Supplier']
 
@@ -178,7 +194,7 @@ class OrderUpdateView(generics.RetrieveUpdateDestroyAPIView):
             return Response({"Error":"Invalid status Update."},status=status.HTTP_400_BAD_REQUEST)
 
         if new_status == "Delivered":
-            if user.role != "Supplier" or user != order.supplier:
+            if user.role != "Supplier" or order.supplier_id != user.pk:
                 return Response({"Error":"Only supplier can update status to delivered"},status=status.HTTP_403_FORBIDDEN)
 
             if order.status != "Pending":
@@ -189,19 +205,39 @@ class OrderUpdateView(generics.RetrieveUpdateDestroyAPIView):
             order.delivered_at = timezone.now()
 
         elif new_status == "Confirmed":
-            if user.role != "Inventory Manager" or order.inventory_manager.user != user:
+            if user.role != "Inventory Manager" or order.inventory_manager.user_id != user.pk:
                 return Response({"error": "Only the assigned inventory manager can confirm this order"},
                                 status=status.HTTP_403_FORBIDDEN)
 
             if order.status != "Delivered":
                 return Response({"error": "Only delivered orders can be confirmed"}, status=status.HTTP_400_BAD_REQUEST)
 
-            order.status = "Confirmed"
-            order.confirmed_by = user
-            order.confirmed_at = timezone.now()
+            confirm_orders([order.pk], user)
+            return Response({"message": f"Order status updated to {new_status}"},status=status.HTTP_200_OK)
 
         order.updated_by = user
         order.updated_at = timezone.now()
         order.save()
 
-        return Response({"message": f"Order status updated to {new_status}"},status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response({"message": f"Order status updated to {new_status}"},status=status.HTTP_200_OK)
+
+class BulkOrderUpdateView(generics.GenericAPIView):
+    serializer_class = OrderTransitionSerializer
+    permission_classes = (permissions.IsAuthenticatedOrReadOnly, RoleBasedPermission)
+    allowed_roles = ['Inventory Manager','Supplier']
+
+    def patch(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data.get('orders'), many=True)
+        if not serializer.is_valid():
+            return Response({"Error":serializer.errors},status=status.HTTP_400_BAD_REQUEST)
+        if not serializer.validated_data:
+            return Response({"Error":"Provide a non-empty list of orders."},status=status.HTTP_400_BAD_REQUEST)
+
+        transitions = {line['id']: line['status'] for line in serializer.validated_data}
+        errors = transition_orders(transitions, request.user)
+
+        results = [
+            {"id":pk,"Error":errors[pk]} if pk in errors else {"id":pk,"status":new_status}
+            for pk, new_status in transitions.items()
+        ]
+        return Response({"message":"Order statuses updated.","results":results},status=status.HTTP_200_OK)
@@ -1,6 +1,6 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
-from base.pagination import MyLimitOffsetPagination
+from base.pagination import MyCursorPagination, MyLimitOffsetPagination
 from base.role_access import RoleBasedPermission
 from order_management.serializers import OrderSerializer
 from supplier.models import Inventory
@@ -15,6 +15,7 @@ class ProductView(generics.ListCreateAPIView):
     permission_classes = (permissions.IsAuthenticatedOrReadOnly, RoleBasedPermission)
     allowed_roles = ['Supplier']
     pagination_class = MyLimitOffsetPagination
+    estimate_count = True
 
     def perform_create(self, serializer):
         supplier = self.request.user
@@ -64,8 +65,8 @@ class SupplierOrderListView(generics.ListAPIView):
     serializer_class = OrderSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly, RoleBasedPermission)
     allowed_roles = ['Supplier']
-    pagination_class = MyLimitOffsetPagination
+    pagination_class = MyCursorPagination
 
     def get_queryset(self):
         user = self.request.user
-        return Order.objects.filter(supplier=user).order_by("-created")
\ No newline at end of file
+        return Order.objects.for_listing().filter(supplier=user).order_by("-created")
\ No newline at end of file